@@ -1,15 +1,105 @@
 """REST client handling, including EmarsysStream base class."""
 
 import requests
+import sys
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, Optional, Union, List, Iterable
+from typing import Any, Callable, Deque, Dict, Optional, Set, Union, List, Iterable
 
-import base64, datetime, hashlib, uuid
+import json, re
+from functools import lru_cache
+
+import backoff
 from memoization import cached
 
+from singer import StateMessage
+from singer_sdk.exceptions import FatalAPIError, RetriableAPIError
+from singer_sdk.helpers._catalog import pop_deselected_record_properties
+from singer_sdk.helpers._typing import conform_record_data_types
 from singer_sdk.helpers.jsonpath import extract_jsonpath
 from singer_sdk.streams import RESTStream
 
+from tap_emarsys.coercion import Coercion, compile_coercions
+from tap_emarsys.fields import FieldCatalogue
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_JSONPATH_STEP = re.compile(r"\.\.(\w+)|\.(\w+)|\[\*\]")
+
+
+def _descendants(node: Any, name: str) -> Iterable[Any]:
+    if isinstance(node, dict):
+        if name in node:
+            yield node[name]
+        children: Iterable[Any] = node.values()
+    elif isinstance(node, list):
+        children = node
+    else:
+        return
+    for child in children:
+        yield from _descendants(child, name)
+
+
+def _field_step(name: str) -> Callable[[Iterable[Any]], Iterable[Any]]:
+    def step(nodes: Iterable[Any]) -> Iterable[Any]:
+        for node in nodes:
+            if isinstance(node, dict) and name in node:
+                yield node[name]
+    return step
+
+
+def _wildcard_step(nodes: Iterable[Any]) -> Iterable[Any]:
+    for node in nodes:
+        if isinstance(node, list):
+            yield from node
+        elif node is not None:
+            # JSONPath treats `[*]` on a single value as a one item list
+            yield node
+
+
+def _descendants_step(name: str) -> Callable[[Iterable[Any]], Iterable[Any]]:
+    def step(nodes: Iterable[Any]) -> Iterable[Any]:
+        for node in nodes:
+            yield from _descendants(node, name)
+    return step
+
+
+@lru_cache(maxsize=None)
+def compile_jsonpath(expression: str) -> Callable[[Any], Iterable[Any]]:
+    """Compile a JSONPath expression into a function extracting its matches.
+
+    Expressions built from `$`, `.field`, `[*]` and `..field` become direct
+    lookups, anything else falls back to a generic JSONPath evaluation.
+    """
+    steps = []
+    position = 1 if expression.startswith("$") else len(expression) + 1
+    while position < len(expression):
+        match = _JSONPATH_STEP.match(expression, position)
+        if not match:
+            break
+        descendant, field = match.group(1), match.group(2)
+        if descendant:
+            steps.append(_descendants_step(descendant))
+        elif field:
+            steps.append(_field_step(field))
+        else:
+            steps.append(_wildcard_step)
+        position = match.end()
+    if position != len(expression):
+        return lambda body: extract_jsonpath(expression, input=body)
+
+    def accessor(body: Any) -> Iterable[Any]:
+        nodes: Iterable[Any] = [body]
+        for step in steps:
+            nodes = step(nodes)
+        return nodes
+
+    return accessor
+
 
 class EmarsysStream(RESTStream):
     """Emarsys stream class."""
@@ -18,36 +108,67 @@ class EmarsysStream(RESTStream):
 
     records_jsonpath = "$.data[*]"
     next_page_token_jsonpath = "$.next_page"  # Or override `get_next_page_token`.
+    # Whether records are built with their schema types, so that setting
+    # `skip_record_validation` writes them as they are
+    conformed_records = False
 
-    @staticmethod
-    def get_auth_header(username, secret):
-        nonce = uuid.uuid4().hex
-        timestamp = datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
-        raw_password_digest = nonce + timestamp + secret
-        encrypted_password_digest = hashlib.sha1()
-        encrypted_password_digest.update(raw_password_digest.encode())
-        pass_sha1 = encrypted_password_digest.hexdigest()
-        pass_digest = base64.b64encode(pass_sha1.encode()).decode()
-        header =  'UsernameToken Username="{}", PasswordDigest="{}", Nonce="{}", Created="{}"'.format(
-            username,
-            pass_digest,
-            nonce,
-            timestamp
-        )
-        return header
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._http_headers: Optional[dict] = None
+        self._partition_executor: Optional[ThreadPoolExecutor] = None
+        self._pending_child_contexts: Deque[dict] = deque()
+        self._prefetched_partitions: Dict[str, Future] = {}
+        self._skips_record_validation: Optional[bool] = None
+        self._coercions: Optional[Dict[str, Coercion]] = None
+        self._uncoercible_properties: Set[str] = set()
+
+    @property
+    def field_catalogue(self) -> FieldCatalogue:
+        """Return the tap's field catalogue, fetching it on first use."""
+        catalogue = self._tap.field_catalogue
+        if not catalogue.loaded:
+            fields_stream = self._tap.streams["fields"]
+            catalogue.load(lambda: fields_stream.request_records(None))
+        return catalogue
+
+    @property
+    def requests_session(self) -> requests.Session:
+        """Return the connection-pooled session shared by all of the tap's streams."""
+        return self._tap.requests_session
+
+    @property
+    def timeout(self) -> int:
+        return self.config["http_timeout"]
 
     @property
     def http_headers(self) -> dict:
-        """Return the http headers needed."""
-        headers = {}
-        if "user_agent" in self.config:
-            headers["User-Agent"] = self.config.get("user_agent")
-        headers["Content-Type"] = "application/json"
-        headers["X-WSSE"] = self.get_auth_header(
-            username=self.config["username"],
-            secret=self.config["secret"]
-        )
-        return headers
+        """Return the http headers needed.
+
+        The X-WSSE header is not among them, since requests are signed by the
+        tap's authenticator as they are sent.
+        """
+        if self._http_headers is None:
+            headers = {}
+            if "user_agent" in self.config:
+                headers["User-Agent"] = self.config.get("user_agent")
+            headers["Content-Type"] = "application/json"
+            self._http_headers = headers
+        # A copy, as the SDK adds its authenticator's headers to it
+        return dict(self._http_headers)
+
+    @staticmethod
+    def decode_response(response: requests.Response) -> Any:
+        """Return the JSON body of a response, decoding it only once.
+
+        Record extraction and pagination both read the body, so the decoded
+        value is kept on the response. orjson is used when it is installed.
+        """
+        try:
+            return response._emarsys_json  # type: ignore[attr-defined]
+        except AttributeError:
+            body = orjson.loads(response.content) if orjson else response.json()
+            response._emarsys_json = body  # type: ignore[attr-defined]
+            return body
 
     def get_next_page_token(
         self, response: requests.Response, previous_token: Optional[Any]
@@ -57,8 +178,8 @@ class EmarsysStream(RESTStream):
         #       next page. If this is the final page, return "None" to end the
         #       pagination loop.
         if self.next_page_token_jsonpath:
-            all_matches = extract_jsonpath(
-                self.next_page_token_jsonpath, response.json()
+            all_matches = compile_jsonpath(self.next_page_token_jsonpath)(
+                self.decode_response(response)
             )
             first_match = next(iter(all_matches), None)
             next_page_token = first_match
@@ -67,6 +188,93 @@ class EmarsysStream(RESTStream):
 
         return next_page_token
 
+    def request_decorator(self, func: Callable) -> Callable:
+        """Retry transient failures with exponential backoff and full jitter.
+
+        Every request of the tap goes through this policy, for at most
+        `max_request_attempts` attempts.
+        """
+        return backoff.on_exception(
+            backoff.expo,
+            (
+                RetriableAPIError,
+                requests.exceptions.ReadTimeout,
+                requests.exceptions.ConnectionError,
+            ),
+            max_tries=self.config["max_request_attempts"],
+            factor=2,
+            jitter=backoff.full_jitter,
+            on_backoff=self._log_backoff,
+        )(func)
+
+    def _log_backoff(self, details: dict) -> None:
+        path = self._metrics_path(details["args"][0])
+        # backoff 1.x leaves the exception out of `details`, but calls this
+        # handler while it is being handled
+        error = details.get("exception") or sys.exc_info()[1]
+        self._tap.request_metrics.record_retry(self.name, path, error)
+        self.logger.warning(
+            "Retrying {path} in {wait:.1f}s after attempt {tries}: {error}".format(
+                path=path,
+                wait=details["wait"],
+                tries=details["tries"],
+                error=error,
+            )
+        )
+
+    def _metrics_path(self, prepared_request: requests.PreparedRequest) -> str:
+        """Return the path template a request is counted under in the metrics."""
+        return getattr(prepared_request, "_emarsys_path", self.path)
+
+    def _prepare_to_send(self, prepared_request: requests.PreparedRequest) -> None:
+        """Wait for the rate limiter, then sign a request.
+
+        Raises `FatalAPIError` instead once another stream of the run has failed,
+        so streams synced concurrently stop at their next request.
+        """
+        self._tap.rate_limiter.acquire()
+        if self._tap.stop_event.is_set():
+            raise FatalAPIError("Stopped, as another stream of the run failed.")
+        self._tap.wsse_authenticator.sign(prepared_request)
+
+    def _request(
+        self, prepared_request: requests.PreparedRequest, context: Optional[dict]
+    ) -> requests.Response:
+        self._prepare_to_send(prepared_request)
+        return super()._request(prepared_request, context)
+
+    def validate_response(self, response: requests.Response) -> None:
+        """Validate HTTP response.
+
+        A 401 usually means the WSSE token was rejected, e.g. for clock skew, so
+        it is retried along with rate limited requests and server errors. Only
+        that request is retried, signed afresh, and the shared session is kept,
+        as its pooled connections are unaffected.
+        """
+        # Every response passes through here, including those about to be retried
+        self._tap.rate_limiter.update(response)
+        self._tap.request_metrics.record_response(
+            self.name, self._metrics_path(response.request), response
+        )
+        if response.status_code in (401, 429):
+            msg = (
+                f"{response.status_code} Client Error: "
+                f"{response.reason} for path: {self.path}"
+            )
+            raise RetriableAPIError(msg)
+        elif 400 <= response.status_code < 500:
+            msg = (
+                f"{response.status_code} Client Error: "
+                f"{response.reason} for path: {self.path}"
+            )
+            raise FatalAPIError(msg)
+        elif 500 <= response.status_code < 600:
+            msg = (
+                f"{response.status_code} Server Error: "
+                f"{response.reason} for path: {self.path}"
+            )
+            raise RetriableAPIError(msg)
+
     def get_url_params(
         self, context: Optional[dict], next_page_token: Optional[Any]
     ) -> Dict[str, Any]:
@@ -92,9 +300,154 @@ class EmarsysStream(RESTStream):
     def parse_response(self, response: requests.Response) -> Iterable[dict]:
         """Parse the response and return an iterator of result rows."""
         # TODO: Parse response body and return a set of records.
-        yield from extract_jsonpath(self.records_jsonpath, input=response.json())
+        records = compile_jsonpath(self.records_jsonpath)
+        yield from records(self.decode_response(response))
 
-    def post_process(self, row: dict, context: Optional[dict]) -> dict:
-        """As needed, append or transform raw data to match expected structure."""
-        # TODO: Delete this method if not needed.
+    def get_records(self, context: Optional[dict]) -> Iterable[Dict[str, Any]]:
+        """Return a generator of row-type dictionary objects.
+
+        Partitions already fetched by the parent stream's executor are served from
+        the prefetched responses, any others are requested as usual.
+        """
+        future = self._prefetched_partitions.pop(self._partition_key(context), None)
+        records = future.result() if future else self.request_records(context)
+        metrics = self._tap.request_metrics
+        for record in records:
+            transformed_record = self.post_process(record, context)
+            if transformed_record is None:
+                # Record filtered out during post_process()
+                continue
+            metrics.record_records(self.name, self.path)
+            yield transformed_record
+        self._flush_child_partitions()
+
+    @staticmethod
+    def _partition_key(context: Optional[dict]) -> str:
+        return json.dumps(context, sort_keys=True, default=str)
+
+    def prefetch_partition(
+        self, context: dict, executor: ThreadPoolExecutor
+    ) -> None:
+        """Start requesting the records of a partition on the given executor."""
+        self._prefetched_partitions[self._partition_key(context)] = executor.submit(
+            lambda: list(self.request_records(dict(context)))
+        )
+
+    def _sync_children(self, child_context: dict) -> None:
+        """Sync child partitions, fetching up to `max_workers` of them at once.
+
+        Child records are requested concurrently but each partition is still
+        synced from this thread in parent order, so RECORD and STATE messages
+        come out exactly as they would sequentially.
+        """
+        max_workers = self.config["max_workers"]
+        if max_workers <= 1:
+            super()._sync_children(child_context)
+            return
+        if self._partition_executor is None:
+            self._partition_executor = ThreadPoolExecutor(max_workers=max_workers)
+        for child_stream in self.child_streams:
+            if isinstance(child_stream, EmarsysStream) and (
+                child_stream.selected or child_stream.has_selected_descendents
+            ):
+                child_stream.prefetch_partition(
+                    child_context, self._partition_executor
+                )
+        self._pending_child_contexts.append(child_context)
+        while len(self._pending_child_contexts) > max_workers:
+            super()._sync_children(self._pending_child_contexts.popleft())
+
+    def _flush_child_partitions(self) -> None:
+        """Sync any child partitions still waiting on the executor."""
+        while self._pending_child_contexts:
+            super()._sync_children(self._pending_child_contexts.popleft())
+        if self._partition_executor is not None:
+            self._partition_executor.shutdown()
+            self._partition_executor = None
+
+    def _write_schema_message(self) -> None:
+        for schema_message in self._generate_schema_messages():
+            self._tap.message_writer.write_message(schema_message)
+
+    @property
+    def _skip_record_validation(self) -> bool:
+        """Return whether records are written without conforming them to the schema.
+
+        Only streams whose records are built with their schema types already, and
+        only while all of their properties are selected, skip it.
+        """
+        if self._skips_record_validation is None:
+            self._skips_record_validation = (
+                self.conformed_records
+                and bool(self.config.get("skip_record_validation"))
+                and all(
+                    self.mask.get(("properties", property_name), True)
+                    for property_name in self.schema["properties"]
+                )
+            )
+        return self._skips_record_validation
+
+    def _write_record_message(self, record: dict) -> None:
+        """Write the RECORD messages of a record through the tap's message writer."""
+        if not self._skip_record_validation:
+            pop_deselected_record_properties(
+                record, self.schema, self.mask, self.logger
+            )
+            record = conform_record_data_types(
+                stream_name=self.name,
+                row=record,
+                schema=self.schema,
+                logger=self.logger,
+            )
+        writer = self._tap.message_writer
+        for stream_map in self.stream_maps:
+            mapped_record = stream_map.transform(record)
+            if mapped_record is not None:
+                writer.write_record(stream_map.stream_alias, mapped_record)
+
+    def _write_state_message(self) -> None:
+        """Write a STATE message with the state of every stream.
+
+        Streams synced concurrently update their own bookmarks as this one writes,
+        so with `max_parallel_streams` the state is copied, by one call into the C
+        JSON encoder, first.
+        """
+        state = self.tap_state
+        if self.config["max_parallel_streams"] > 1:
+            state = json.loads(json.dumps(state))
+        self._tap.message_writer.write_message(StateMessage(value=state))
+
+    @property
+    def coercions(self) -> Dict[str, Coercion]:
+        """Return the coercion of each property of the schema, compiled on first use."""
+        if self._coercions is None:
+            self._coercions = compile_coercions(self.schema)
+        return self._coercions
+
+    def coerce(self, row: dict) -> dict:
+        """Cast the values of a row to the types of their properties, in place.
+
+        A value that cannot be cast is nulled, with a warning the first time it
+        happens to each property, rather than failing the partition.
+        """
+        for property_name, coercion in self.coercions.items():
+            if property_name in row:
+                try:
+                    row[property_name] = coercion(row[property_name])
+                except (TypeError, ValueError):
+                    if property_name not in self._uncoercible_properties:
+                        self._uncoercible_properties.add(property_name)
+                        self.logger.warning(
+                            "Writing null for the value {value!r} of '{property}' in "
+                            "stream '{stream}', which does not match its type.".format(
+                                value=row[property_name],
+                                property=property_name,
+                                stream=self.name,
+                            )
+                        )
+                    row[property_name] = None
         return row
+
+    def post_process(self, row: dict, context: Optional[dict]) -> dict:
+        """Cast the values of each record to the types of its schema."""
+        return self.coerce(row)
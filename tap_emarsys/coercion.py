@@ -0,0 +1,60 @@
+"""Coercion of API values to the types of a stream's schema."""
+
+from typing import Any, Callable, Dict, Optional, Union
+
+Coercion = Callable[[Any], Any]
+
+
+def to_number(value: Any) -> Optional[Union[int, float]]:
+    """Return `value` as an int, or a float if it has a fraction.
+
+    Nulls and empty strings are None. Raises `ValueError` or `TypeError` for
+    anything else that is not a number.
+    """
+    if value is None or value == "":
+        return None
+    if type(value) is int or type(value) is float:
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def to_integer(value: Any) -> Optional[int]:
+    """Return `value` as an int, truncating any fraction."""
+    number = to_number(value)
+    return number if number is None or type(number) is int else int(number)
+
+
+def to_string(value: Any) -> Optional[str]:
+    """Return `value` as a string, keeping nulls null."""
+    if value is None or type(value) is str:
+        return value
+    return str(value)
+
+
+COERCIONS: Dict[str, Coercion] = {
+    "number": to_number,
+    "integer": to_integer,
+    "string": to_string,
+}
+
+
+def compile_coercions(schema: dict) -> Dict[str, Coercion]:
+    """Return the coercion of each top-level number, integer or string property.
+
+    Formatted strings, e.g. date-times, and other types are left to the SDK to
+    conform, so they have no coercion.
+    """
+    coercions = {}
+    for property_name, property_schema in schema["properties"].items():
+        types = property_schema.get("type", [])
+        types = [types] if isinstance(types, str) else types
+        if "format" in property_schema:
+            continue
+        for json_type in types:
+            if json_type in COERCIONS:
+                coercions[property_name] = COERCIONS[json_type]
+                break
+    return coercions
@@ -0,0 +1,129 @@
+"""Field catalogue shared by the streams of a tap run."""
+
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+
+class FieldCatalogue:
+    """Index of the account's fields, fetched at most once per tap run.
+
+    When `cache_path` is set the catalogue is also persisted to disk, and a copy
+    younger than `ttl` seconds is reused by later runs instead of calling the API.
+    """
+
+    def __init__(
+        self,
+        language_id: str,
+        cache_path: Optional[str] = None,
+        ttl: Optional[int] = None,
+    ) -> None:
+        self.language_id = language_id
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.ttl = ttl
+        self._fields: Optional[List[dict]] = None
+        self._by_id: Dict[int, dict] = {}
+        self._by_string_id: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._fields is not None
+
+    @property
+    def fields(self) -> List[dict]:
+        if self._fields is None:
+            raise RuntimeError("Field catalogue has not been loaded yet.")
+        return self._fields
+
+    @property
+    def ids(self) -> List[int]:
+        return [field["id"] for field in self.fields]
+
+    def get(self, field_id: int) -> Optional[dict]:
+        return self._by_id.get(int(field_id))
+
+    def get_by_string_id(self, string_id: str) -> Optional[dict]:
+        return self._by_string_id.get(string_id)
+
+    def resolve(self, key: Any) -> Optional[dict]:
+        """Return the field whose `string_id` or, failing that, ID is `key`."""
+        field = self.get_by_string_id(str(key))
+        if field is None and str(key).isdigit():
+            field = self.get(int(key))
+        return field
+
+    def project(
+        self,
+        include: Optional[Iterable[Any]] = None,
+        exclude: Optional[Iterable[Any]] = None,
+    ) -> List[dict]:
+        """Return the fields in `include`, or all fields if it is empty, less `exclude`.
+
+        Both are lists of `string_id`s or IDs. Raises `ValueError` for a key that
+        matches no field.
+        """
+
+        def field_ids(keys: Iterable[Any]) -> Set[int]:
+            ids = set()
+            for key in keys:
+                field = self.resolve(key)
+                if field is None:
+                    raise ValueError("Unknown contact field '{key}'".format(key=key))
+                ids.add(int(field["id"]))
+            return ids
+
+        included = field_ids(include) if include else None
+        excluded = field_ids(exclude or [])
+        return [
+            field
+            for field in self.fields
+            if (included is None or int(field["id"]) in included)
+            and int(field["id"]) not in excluded
+        ]
+
+    def load(self, fetch: Callable[[], Iterable[dict]]) -> List[dict]:
+        """Populate the catalogue from the disk cache or `fetch`, if not done yet."""
+        with self._lock:
+            if self._fields is None:
+                fields = self._read_cache()
+                if fields is None:
+                    fields = [dict(field) for field in fetch()]
+                    self._write_cache(fields)
+                self._by_id = {int(field["id"]): field for field in fields}
+                self._by_string_id = {
+                    field["string_id"]: field
+                    for field in fields
+                    if field.get("string_id")
+                }
+                self._fields = fields
+        return self._fields
+
+    def _read_cache(self) -> Optional[List[dict]]:
+        if not self.cache_path or not self.cache_path.exists():
+            return None
+        try:
+            cached = json.loads(self.cache_path.read_text())
+            if cached["language_id"] != self.language_id:
+                return None
+            if self.ttl is not None and time.time() - cached["fetched_at"] > self.ttl:
+                return None
+            return list(cached["fields"])
+        except (ValueError, KeyError, TypeError):
+            # A corrupt cache is fetched again and overwritten
+            return None
+
+    def _write_cache(self, fields: List[dict]) -> None:
+        if not self.cache_path:
+            return
+        self.cache_path.write_text(
+            json.dumps(
+                {
+                    "language_id": self.language_id,
+                    "fetched_at": time.time(),
+                    "fields": fields,
+                }
+            )
+        )
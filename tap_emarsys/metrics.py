@@ -0,0 +1,160 @@
+"""Request and record metrics of a tap run, per stream and endpoint."""
+
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+# Latency percentiles are estimated from a fixed-size sample of each endpoint
+LATENCY_SAMPLE_SIZE = 1000
+
+
+class EndpointMetrics:
+    """Counters for the requests one stream made to one path template."""
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.retries = 0
+        self.status_codes: Counter = Counter()
+        self.bytes_received = 0
+        self.records = 0
+        self.latency_seen = 0
+        self.latency_sample: List[float] = []
+
+    def add_latency(self, seconds: float) -> None:
+        """Add a latency to the reservoir sample the percentiles are read from."""
+        self.latency_seen += 1
+        if len(self.latency_sample) < LATENCY_SAMPLE_SIZE:
+            self.latency_sample.append(seconds)
+            return
+        index = random.randrange(self.latency_seen)
+        if index < LATENCY_SAMPLE_SIZE:
+            self.latency_sample[index] = seconds
+
+    def to_dict(self) -> dict:
+        latencies = sorted(self.latency_sample)
+
+        def percentile(fraction: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(
+                latencies[min(int(fraction * len(latencies)), len(latencies) - 1)], 6
+            )
+
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            # Status codes are ints, and errors without a response are named
+            "status_codes": {
+                str(status): count
+                for status, count in sorted(
+                    self.status_codes.items(), key=lambda item: str(item[0])
+                )
+            },
+            "latency_p50": percentile(0.5),
+            "latency_p90": percentile(0.9),
+            "latency_p99": percentile(0.99),
+            "latency_max": round(latencies[-1], 6) if latencies else None,
+            "bytes_received": self.bytes_received,
+            "records": self.records,
+        }
+
+
+class RequestMetrics:
+    """Metrics shared by every stream of a tap run.
+
+    Each stream and path template gets its own request, retry, status code,
+    latency, byte and record counts. They are logged as `METRIC:` JSON lines,
+    like the SDK's own metrics, every `interval` seconds when it is set, and
+    once more by `log_summary` at the end of the run.
+    """
+
+    def __init__(
+        self, logger: logging.Logger, interval: Optional[float] = None
+    ) -> None:
+        self.logger = logger
+        self.interval = interval
+        self._endpoints: Dict[Tuple[str, str], EndpointMetrics] = {}
+        self._started = time.monotonic()
+        self._next_log = self._started + interval if interval else None
+        self._lock = threading.Lock()
+
+    def _endpoint(self, stream: str, path: str) -> EndpointMetrics:
+        key = (stream, path)
+        if key not in self._endpoints:
+            self._endpoints[key] = EndpointMetrics()
+        return self._endpoints[key]
+
+    def record_response(
+        self, stream: str, path: str, response: requests.Response
+    ) -> None:
+        """Count a response, whether or not it is about to be retried."""
+        if response.raw is None or getattr(response, "_content_consumed", False):
+            size = len(response.content)
+        else:
+            # Streamed bodies are not read here
+            size = int(response.headers.get("Content-Length") or 0)
+        with self._lock:
+            endpoint = self._endpoint(stream, path)
+            endpoint.requests += 1
+            endpoint.status_codes[response.status_code] += 1
+            endpoint.bytes_received += size
+            endpoint.add_latency(response.elapsed.total_seconds())
+        self.maybe_log()
+
+    def record_retry(
+        self, stream: str, path: str, error: Optional[BaseException]
+    ) -> None:
+        """Count a retry, and the error of a request that got no response."""
+        with self._lock:
+            endpoint = self._endpoint(stream, path)
+            endpoint.retries += 1
+            if isinstance(error, requests.exceptions.RequestException):
+                endpoint.requests += 1
+                endpoint.status_codes[type(error).__name__] += 1
+
+    def record_records(self, stream: str, path: str, count: int = 1) -> None:
+        with self._lock:
+            self._endpoint(stream, path).records += count
+
+    def maybe_log(self) -> None:
+        """Log the metrics so far if the interval has elapsed since they were last."""
+        if self._next_log is None or time.monotonic() < self._next_log:
+            return
+        with self._lock:
+            if time.monotonic() < self._next_log:
+                return
+            self._next_log = time.monotonic() + self.interval
+        self._log("api_usage")
+
+    def log_summary(self) -> None:
+        """Log the metrics of the whole run."""
+        self._log("api_usage_summary")
+
+    def snapshot(self) -> Dict[Tuple[str, str], dict]:
+        """Return the metrics so far of each stream and path template."""
+        with self._lock:
+            return {
+                key: endpoint.to_dict()
+                for key, endpoint in sorted(self._endpoints.items())
+            }
+
+    def _log(self, metric: str) -> None:
+        elapsed = round(time.monotonic() - self._started, 3)
+        for (stream, path), value in self.snapshot().items():
+            self.logger.info(
+                "METRIC: %s",
+                json.dumps(
+                    {
+                        "type": "summary",
+                        "metric": metric,
+                        "value": dict(value, elapsed=elapsed),
+                        "tags": {"stream": stream, "endpoint": path},
+                    }
+                ),
+            )
@@ -0,0 +1,129 @@
+"""Buffered output of the Singer messages of a tap run."""
+
+import datetime
+import sys
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import simplejson
+import singer
+from singer import StateMessage
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def format_message(message: dict) -> str:
+    """Encode a message as JSON, with orjson when it is installed."""
+    if orjson:
+        try:
+            return orjson.dumps(message).decode()
+        except TypeError:
+            # e.g. Decimals, which the Singer library encodes as numbers
+            pass
+    return simplejson.dumps(message, use_decimal=True)
+
+
+class MessageWriter:
+    """Writes the Singer messages of every stream to stdout through one buffer.
+
+    Messages are buffered until `buffer_size` characters have accumulated,
+    `flush_interval` seconds have passed since the last write to stdout, or a
+    STATE message is written, so a target never sees a state before the
+    records it covers. Each message is written whole, whichever thread writes it.
+    A background thread writes out messages left buffered for `flush_interval`
+    seconds while no others come, e.g. while an export is polled, until the
+    writer is closed.
+    """
+
+    def __init__(self, buffer_size: int, flush_interval: float) -> None:
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self._buffer: List[str] = []
+        self._buffered = 0
+        self._last_flush = time.monotonic()
+        self._extracted: Tuple[int, str] = (0, "")
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+    def time_extracted(self) -> str:
+        """Return the current UTC time for `time_extracted`, formatted once a second."""
+        now = time.time()
+        second, extracted = self._extracted
+        if second != int(now):
+            extracted = singer.utils.strftime(
+                datetime.datetime.fromtimestamp(now, datetime.timezone.utc)
+            )
+            self._extracted = (int(now), extracted)
+        return extracted
+
+    def write_record(self, stream: str, record: dict) -> None:
+        """Write a RECORD message, as `singer.RecordMessage` would have it."""
+        self._write(
+            format_message(
+                {
+                    "type": "RECORD",
+                    "stream": stream,
+                    "record": record,
+                    "time_extracted": self.time_extracted(),
+                }
+            ),
+            flush=False,
+        )
+
+    def write_message(self, message: singer.Message) -> None:
+        """Write any other message, flushing the buffer after a STATE message."""
+        self._write(
+            format_message(message.asdict()), flush=isinstance(message, StateMessage)
+        )
+
+    def _write(self, line: str, flush: bool) -> None:
+        with self._lock:
+            self._buffer.append(line)
+            self._buffer.append("\n")
+            self._buffered += len(line) + 1
+            if (
+                flush
+                or self._buffered >= self.buffer_size
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            ):
+                self._flush()
+            elif self._flusher is None:
+                self._flusher = threading.Thread(
+                    target=self._flush_when_due, name="message-writer", daemon=True
+                )
+                self._flusher.start()
+
+    def _flush_when_due(self) -> None:
+        while True:
+            with self._lock:
+                wait = self._last_flush + self.flush_interval - time.monotonic()
+                if wait <= 0:
+                    if self._buffer:
+                        self._flush()
+                    wait = self.flush_interval
+            if self._closed.wait(wait):
+                return
+
+    def flush(self) -> None:
+        """Write out any buffered messages."""
+        with self._lock:
+            self._flush()
+
+    def close(self) -> None:
+        """Write out any buffered messages and stop the background flushes."""
+        self._closed.set()
+        self.flush()
+
+    def _flush(self) -> None:
+        if self._buffer:
+            # stdout is looked up on every flush, as it may have been redirected
+            sys.stdout.write("".join(self._buffer))
+            self._buffer = []
+            self._buffered = 0
+        sys.stdout.flush()
+        self._last_flush = time.monotonic()
@@ -0,0 +1,99 @@
+"""Client-side pacing of requests to the Emarsys API."""
+
+import email.utils
+import threading
+import time
+from typing import Optional
+
+import requests
+
+
+class RateLimiter:
+    """Token bucket shared by every request a tap run makes.
+
+    `rate` caps the requests per second, and `None` leaves requests unpaced
+    until the API reports its quota. The pace is tightened to spread whatever
+    quota the `X-Ratelimit-*` headers say is left over the rest of the window,
+    and requests wait out the window entirely once it is exhausted or on a 429.
+    """
+
+    def __init__(self, rate: Optional[float] = None) -> None:
+        self.rate = rate
+        self._adaptive_rate: Optional[float] = None
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def _capacity(self) -> float:
+        return max(1.0, self.rate or 1.0)
+
+    @property
+    def _effective_rate(self) -> Optional[float]:
+        rates = [rate for rate in (self.rate, self._adaptive_rate) if rate]
+        return min(rates) if rates else None
+
+    def acquire(self) -> None:
+        """Block until a request may be sent."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._blocked_until - now
+                rate = self._effective_rate
+                if wait <= 0:
+                    if rate is None:
+                        return
+                    self._tokens = min(
+                        self._capacity, self._tokens + (now - self._updated) * rate
+                    )
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / rate
+            time.sleep(wait)
+
+    def update(self, response: requests.Response) -> None:
+        """Adapt the pace to the quota reported by a response."""
+        headers = response.headers
+        if response.status_code == 429 and "Retry-After" in headers:
+            retry_after = _retry_after_seconds(headers["Retry-After"])
+            if retry_after is not None:
+                self._block_for(retry_after)
+                return
+        remaining = headers.get("X-Ratelimit-Remaining")
+        reset = headers.get("X-Ratelimit-Reset")
+        if remaining is None or reset is None:
+            return
+        seconds_left = float(reset)
+        if seconds_left > 1e9:
+            # An epoch timestamp rather than a number of seconds
+            seconds_left -= time.time()
+        seconds_left = max(seconds_left, 1.0)
+        if int(remaining) <= 0 or response.status_code == 429:
+            self._block_for(seconds_left)
+            return
+        with self._lock:
+            self._adaptive_rate = int(remaining) / seconds_left
+
+    def _block_for(self, seconds: float) -> None:
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+def _retry_after_seconds(value: str) -> Optional[float]:
+    """Return the seconds to wait for a `Retry-After` value.
+
+    The header is either a number of seconds or an HTTP date. Values that are
+    neither are None, so the quota headers decide the wait instead.
+    """
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
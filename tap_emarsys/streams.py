@@ -1,17 +1,22 @@
 """Stream type classes for tap-emarsys."""
-import copy
+import csv
 import datetime
-from urllib.parse import urlparse
-from urllib.parse import parse_qs
+import hashlib
+import io
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, Optional, Union, List, Iterable
+from typing import Any, Dict, Mapping, Optional, Tuple, List, Iterable
 
 import requests
 from singer_sdk import typing as th  # JSON Schema typing helpers
-from singer_sdk.helpers.jsonpath import extract_jsonpath
-from singer_sdk.exceptions import FatalAPIError, RetriableAPIError
+from singer_sdk.exceptions import FatalAPIError
+from singer_sdk.helpers._state import get_state_if_exists
 
-from tap_emarsys.client import EmarsysStream
+from tap_emarsys.client import EmarsysStream, compile_jsonpath
+from tap_emarsys.fields import FieldCatalogue
 
 
 class FieldsStream(EmarsysStream):
@@ -27,6 +32,10 @@ class FieldsStream(EmarsysStream):
         th.Property("string_id", th.StringType),
     ).to_dict()
 
+    def get_records(self, context: Optional[dict]) -> Iterable[Dict[str, Any]]:
+        for field in self.field_catalogue.fields:
+            yield dict(field)
+
     def get_child_context(self, record: dict, context: Optional[dict]) -> dict:
         """Return a context dictionary for child streams."""
         return {
@@ -40,36 +49,75 @@ class ContactIdsStream(EmarsysStream):
     path = "/contact/query/"
     primary_keys = ["id"]
     replication_key = None
+    next_page_token_jsonpath = None
     records_jsonpath = "$.data.result[*]"
 
     schema = th.PropertiesList(
         th.Property("id", th.NumberType),
     ).to_dict()
 
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._contact_id_batch: List[int] = []
+
     def get_child_context(self, record: dict, context: Optional[dict]) -> dict:
         """Return a context dictionary for child streams."""
         return {
             "contact_id": record["id"]
         }
 
+    def _sync_children(self, child_context: dict) -> None:
+        """Buffer contact IDs so child streams can request them in batches."""
+        if self.config.get("contact_fields_export"):
+            # Children are synced once, from a bulk export, after the last contact
+            return
+        if self.config["contact_batch_size"] <= 1:
+            super()._sync_children(child_context)
+            return
+        self._contact_id_batch.append(child_context["contact_id"])
+        if len(self._contact_id_batch) >= self.config["contact_batch_size"]:
+            self._flush_contact_id_batch()
+
+    def _flush_contact_id_batch(self) -> None:
+        if not self._contact_id_batch:
+            return
+        batch, self._contact_id_batch = self._contact_id_batch, []
+        super()._sync_children({"contact_ids": batch})
+
+    def _flush_child_partitions(self) -> None:
+        # The final record's children have been synced by the time the SDK asks
+        # for the next record, so any remaining partial batch can go out now.
+        if self.config.get("contact_fields_export"):
+            super()._sync_children({})
+        self._flush_contact_id_batch()
+        super()._flush_child_partitions()
+
     def get_url_params(
             self, context: Optional[dict], next_page_token: Optional[Any]
     ) -> Optional[dict]:
         params = {
-            "limit": 10000,
+            "limit": self.config["contact_page_size"],
             "offset": next_page_token if next_page_token else 0,
             "return": "3"
         }
+        if context and "modified_on" in context:
+            params[str(self._modified_field_id)] = context["modified_on"]
         self.logger.debug(params)
         return params
 
+    def parse_response(self, response: requests.Response) -> Iterable[dict]:
+        # `result` is `false` rather than an empty list when no contact matched
+        for row in super().parse_response(response):
+            if row:
+                yield row
+
     def get_next_page_token(
         self, response: requests.Response, previous_token: Optional[Any]
     ) -> Optional[Any]:
         """Return a token for identifying next page or None if no more pages."""
         if self.next_page_token_jsonpath:
-            all_matches = extract_jsonpath(
-                self.next_page_token_jsonpath, response.json()
+            all_matches = compile_jsonpath(self.next_page_token_jsonpath)(
+                self.decode_response(response)
             )
             first_match = next(iter(all_matches), None)
             next_page_token = first_match
@@ -77,15 +125,150 @@ class ContactIdsStream(EmarsysStream):
             next_page_token = response.headers.get("X-Next-Page", None)
         else:
             offset = previous_token or 0
-            if len(response.json()["data"]["result"]) == 10000:
-                next_page_token = offset + 10000
+            page_size = self.config["contact_page_size"]
+            if len(self.decode_response(response)["data"]["result"] or []) == page_size:
+                next_page_token = offset + page_size
             else:
                 next_page_token = None
         return next_page_token
 
-    def post_process(self, row: dict, context: Optional[dict] = None) -> Optional[dict]:
-        row["id"] = int(row["id"])
-        return row
+    @property
+    def _modified_field_id(self) -> Optional[int]:
+        """Return the ID of the `contact_modified_field`, if one is configured."""
+        field_key = self.config.get("contact_modified_field")
+        if not field_key:
+            return None
+        field = self.field_catalogue.resolve(field_key)
+        if field is None:
+            raise FatalAPIError(
+                "Unknown contact_modified_field '{field}'".format(field=field_key)
+            )
+        return field["id"]
+
+    def request_records(self, context: Optional[dict]) -> Iterable[dict]:
+        """List contacts, checkpointing the listing as it goes.
+
+        With a `contact_modified_field` and a bookmark, only contacts modified
+        since the bookmarked day are listed, a day at a time as /contact/query/
+        only matches field values exactly. Otherwise all contacts are listed, in
+        far fewer requests than a day at a time since `start_date` would take.
+        Once the listing and the children of every listed contact are synced,
+        the bookmark moves to the day the listing started.
+
+        Every `contact_checkpoint_pages` pages, once the children of the listed
+        contacts have been synced, the next offset is written to state so that an
+        interrupted sync resumes from there. A completed listing clears it.
+        Nothing is listed for a `contact_fields_export` unless `contact_ids` is
+        selected itself.
+        """
+        if self.config.get("contact_fields_export") and not self.selected:
+            # The export lists the segment's contacts itself, after the last contact
+            return
+        today = datetime.date.today()
+        state = self.stream_state
+        modified_field_id = self._modified_field_id
+        modified_since = state.get("modified_since")
+        if modified_field_id is None or not modified_since:
+            yield from self._list_contacts(context, state.get("offset") or 0)
+        else:
+            day = datetime.date.fromisoformat(
+                (state.get("modified_on") or modified_since)[:10]
+            )
+            offset = state.get("offset") or 0
+            # A contact modified again on a later day is listed again
+            listed = set()
+            while day <= today:
+                query = dict(context or {}, modified_on=day.isoformat())
+                for row in self._list_contacts(query, offset):
+                    if row["id"] not in listed:
+                        listed.add(row["id"])
+                        yield row
+                offset = 0
+                day += datetime.timedelta(days=1)
+                if self.config["contact_checkpoint_pages"] and day <= today:
+                    self._checkpoint(0, modified_on=day.isoformat())
+        # Pending children are synced before the bookmark moves past their contacts
+        self._flush_contact_id_batch()
+        super()._flush_child_partitions()
+        state.pop("offset", None)
+        state.pop("modified_on", None)
+        if modified_field_id is not None:
+            state["modified_since"] = today.isoformat()
+
+    def _list_contacts(self, context: Optional[dict], offset: int) -> Iterable[dict]:
+        if offset:
+            self.logger.info(
+                "Resuming contact listing from offset {offset}".format(offset=offset)
+            )
+        checkpoint_pages = self.config["contact_checkpoint_pages"]
+        for page, (page_offset, rows) in enumerate(
+            self._request_pages(context, offset), start=1
+        ):
+            yield from rows
+            if checkpoint_pages and page % checkpoint_pages == 0:
+                self._checkpoint(
+                    page_offset + len(rows),
+                    modified_on=(context or {}).get("modified_on"),
+                )
+
+    def _request_pages(
+        self, context: Optional[dict], offset: int
+    ) -> Iterable[Tuple[int, List[dict]]]:
+        """Yield the offset and rows of each page, up to `max_workers` at a time.
+
+        The total is not known up front, so pages are requested speculatively
+        ahead of the one being read and yielded in offset order. Listing stops at
+        the first short page, wasting at most `max_workers - 1` requests.
+        """
+        max_workers = self.config["max_workers"]
+        page_size = self.config["contact_page_size"]
+        decorated_request = self.request_decorator(self._request)
+
+        if max_workers <= 1:
+            while offset is not None:
+                prepared_request = self.prepare_request(context, next_page_token=offset)
+                response = decorated_request(prepared_request, context)
+                yield offset, list(self.parse_response(response))
+                offset = self.get_next_page_token(response, offset)
+            return
+
+        def request_page(page_offset: int) -> List[dict]:
+            prepared_request = self.prepare_request(
+                context, next_page_token=page_offset
+            )
+            response = decorated_request(prepared_request, context)
+            return list(self.parse_response(response))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pages = deque(
+                (page_offset, executor.submit(request_page, page_offset))
+                for page_offset in range(
+                    offset, offset + max_workers * page_size, page_size
+                )
+            )
+            next_offset = offset + max_workers * page_size
+            while pages:
+                page_offset, rows = pages.popleft()
+                rows = rows.result()
+                yield page_offset, rows
+                if len(rows) < page_size:
+                    break
+                pages.append((next_offset, executor.submit(request_page, next_offset)))
+                next_offset += page_size
+            for _, page in pages:
+                page.cancel()
+
+    def _checkpoint(self, offset: int, modified_on: Optional[str] = None) -> None:
+        """Sync the children of every contact listed so far, then save `offset`.
+
+        In incremental listings `modified_on` is the day the offset belongs to.
+        """
+        self._flush_contact_id_batch()
+        super()._flush_child_partitions()
+        self.stream_state["offset"] = offset
+        if modified_on:
+            self.stream_state["modified_on"] = modified_on
+        self._write_state_message()
 
 
 class ContactFieldsStream(EmarsysStream):
@@ -95,10 +278,12 @@ class ContactFieldsStream(EmarsysStream):
     ignore_parent_replication_keys = True
     path = "/contact/getdata"
     primary_keys = ["contact_id", "field_id"]
-    state_partitioning_keys = ["contact_id", "field_id"]
+    # Contact partitions share the stream's state rather than adding an entry each
+    state_partitioning_keys: List[str] = []
     replication_key = None
     next_page_token_jsonpath = None
     records_jsonpath = "$.data.result[*]"
+    conformed_records = True
 
     schema = th.PropertiesList(
         th.Property("contact_id", th.NumberType),
@@ -107,48 +292,265 @@ class ContactFieldsStream(EmarsysStream):
         th.Property("field_value", th.StringType),
     ).to_dict()
 
-    def post_process(self, row: dict, context: Optional[dict] = None) -> Optional[dict]:
-        new_rows = []
-        for key, value in row.items():
-            if key not in ["id", "uid"]:
-                new_row = dict(contact_id=int(row["id"]), uid=row["uid"])
-                new_row['field_id'] = int(key)
-                new_row['field_value'] = str(value)
-                new_rows.append(new_row)
-        return new_rows
+    _field_ids: Optional[List[int]] = None
+
+    @staticmethod
+    def _projected_fields(
+        catalogue: FieldCatalogue, config: Mapping[str, Any]
+    ) -> List[dict]:
+        """Return the fields left by the contact field include and exclude lists."""
+        try:
+            return catalogue.project(
+                config.get("contact_fields_include"),
+                config.get("contact_fields_exclude"),
+            )
+        except ValueError as error:
+            raise FatalAPIError(str(error)) from error
+
+    @property
+    def field_ids(self) -> List[int]:
+        """Return the IDs of the fields requested for each contact."""
+        if self._field_ids is None:
+            fields = self._projected_fields(self.field_catalogue, self.config)
+            self._field_ids = [field["id"] for field in fields]
+        return self._field_ids
 
     def prepare_request_payload(
             self, context: Optional[dict], next_page_token: Optional[Any]
     ) -> Optional[dict]:
         params = {
             'keyId': 'id',
-            'fields': context['available_field_ids'],
-            'keyValues': [context['contact_id']]
+            'fields': self.field_ids,
+            'keyValues': context.get('contact_ids') or [context['contact_id']]
         }
         self.logger.debug(params)
         return params
 
-    def get_records(self, context: Optional[dict]) -> Iterable[Dict[str, Any]]:
-        context = context or {}
-        if context.get('available_field_ids') is None:
-            headers = self.http_headers
-            authenticator = self.authenticator
-            if authenticator:
-                headers.update(authenticator.auth_headers or {})
-            response = requests.get(
-                url="".join([self.url_base, "/field/translate/" + self.config['language_id'] or ""]),
-                headers=headers,
+    def parse_response(self, response: requests.Response) -> Iterable[dict]:
+        """Parse the response, logging any contacts the API could not return."""
+        data = self.decode_response(response)["data"]
+        errors = data.get("errors") or []
+        for error in errors:
+            self.logger.debug(
+                "Contact {key} not returned: {code} {msg}".format(
+                    key=error.get("key"),
+                    code=error.get("errorCode"),
+                    msg=error.get("errorMsg"),
+                )
+            )
+        if errors:
+            self.logger.warning(
+                "{count} contact(s) could not be retrieved from {path}".format(
+                    count=len(errors), path=self.path
+                )
+            )
+        # `result` is `false` rather than an empty list when no contact matched
+        for row in data.get("result") or []:
+            yield from self.contact_records(row)
+
+    def contact_records(self, row: dict) -> Iterable[dict]:
+        """Lazily yield one record per field of a contact keyed by field ID.
+
+        Empty values are left out when `contact_fields_skip_empty` is set.
+        Subclasses override this to shape the records of each contact row.
+        The IDs are cast here, once per contact and field, and the values by
+        `post_process`.
+        """
+        contact_id = int(row["id"])
+        uid = row["uid"]
+        skip_empty = self.config.get("contact_fields_skip_empty")
+        for key, value in row.items():
+            if key == "id" or key == "uid":
+                continue
+            if skip_empty and (value is None or value == ""):
+                continue
+            yield {
+                "contact_id": contact_id,
+                "uid": uid,
+                "field_id": int(key),
+                "field_value": value,
+            }
+
+    def prefetch_partition(
+        self, context: dict, executor: ThreadPoolExecutor
+    ) -> None:
+        # A bulk export is streamed rather than held in memory
+        if context:
+            super().prefetch_partition(context, executor)
+
+    def request_records(self, context: Optional[dict]) -> Iterable[dict]:
+        if context:
+            yield from super().request_records(context)
+            return
+        # Without a contact partition, all contacts come from one bulk export
+        yield from self.request_export_records()
+
+    def _send_export_request(
+        self,
+        method: str,
+        path: str,
+        payload: Optional[dict] = None,
+        stream: bool = False,
+        **path_params: Any,
+    ) -> requests.Response:
+        prepared_request = self.requests_session.prepare_request(
+            requests.Request(
+                method=method,
+                url="".join([self.url_base, path.format(**path_params)]),
+                headers=self.http_headers,
+                json=payload,
+            )
+        )
+        # Metrics are kept per path template rather than per export
+        prepared_request._emarsys_path = path  # type: ignore[attr-defined]
+
+        def send(prepared_request: requests.PreparedRequest) -> requests.Response:
+            self._prepare_to_send(prepared_request)
+            response = self.requests_session.send(
+                prepared_request, stream=stream, timeout=self.timeout
+            )
+            self.validate_response(response)
+            return response
+
+        return self.request_decorator(send)(prepared_request)
+
+    def request_export_records(self) -> Iterable[dict]:
+        """Export every field of the segment's contacts and stream the CSV.
+
+        The export is submitted for `contact_export_segment_id`, polled every
+        `contact_export_poll_interval` seconds and its CSV download exploded into
+        the same records as /contact/getdata.
+        """
+        response = self._send_export_request(
+            "POST",
+            "/export/filter",
+            payload={
+                "filter": self.config["contact_export_segment_id"],
+                "contact_fields": self.field_ids,
+                "distribution_method": "local",
+                "add_field_names_header": 1,
+                "language": self.config["language_id"],
+                "delimiter": ",",
+            },
+        )
+        export_id = self.decode_response(response)["data"]["id"]
+        self.logger.info(
+            "Submitted contact export {export_id}.".format(export_id=export_id)
+        )
+
+        deadline = time.monotonic() + self.config["contact_export_timeout"]
+        while True:
+            response = self._send_export_request(
+                "GET", "/export/{export_id}", export_id=export_id
             )
-            response.raise_for_status()
-            response_json = response.json()
-            context['available_field_ids'] = [result['id'] for result in response_json['data']]
-        for record in self.request_records(context):
-            transformed_records = self.post_process(record, context)
-            if transformed_records is None or len(transformed_records) == 0:
-                # Record filtered out during post_process()
+            status = self.decode_response(response)["data"]["status"]
+            if status == "done":
+                break
+            if status in ("error", "failed", "cancelled"):
+                raise FatalAPIError(
+                    "Contact export {export_id} ended with status '{status}'".format(
+                        export_id=export_id, status=status
+                    )
+                )
+            if time.monotonic() > deadline:
+                raise FatalAPIError(
+                    "Contact export {export_id} did not finish in time".format(
+                        export_id=export_id
+                    )
+                )
+            time.sleep(self.config["contact_export_poll_interval"])
+
+        response = self._send_export_request(
+            "GET", "/export/{export_id}/data", stream=True, export_id=export_id
+        )
+        # Read as the CSV module expects, so quoted values keep their line breaks,
+        # leaving the body open until the wrapper has read all of it
+        response.raw.decode_content = True
+        response.raw.auto_close = False
+        with response:
+            reader = csv.reader(
+                io.TextIOWrapper(response.raw, encoding="utf-8", newline="")
+            )
+            columns = self._export_columns(next(reader, []))
+            for values in reader:
+                row = {
+                    column: value
+                    for column, value in zip(columns, values)
+                    if column is not None
+                }
+                yield from self.contact_records(row)
+
+    def _export_columns(self, header: List[str]) -> List[Optional[str]]:
+        """Map export CSV headers to the keys /contact/getdata would return."""
+        keys = {"user_id": "id", "id": "id", "uid": "uid"}
+        for field in self.field_catalogue.fields:
+            for alias in (field["name"], field["string_id"], str(field["id"])):
+                if alias:
+                    keys.setdefault(alias, str(field["id"]))
+        columns = [keys.get(column) for column in header]
+        for column, key in zip(header, columns):
+            if key is None:
+                self.logger.warning(
+                    "Ignoring unknown contact export column '{column}'.".format(
+                        column=column
+                    )
+                )
+        return columns
+
+
+class ContactsWideStream(ContactFieldsStream):
+    """One record per contact, with a property for each field in the catalogue.
+
+    The schema is built from the field catalogue when the stream is created,
+    so the stream is only discovered when `contacts_wide` is enabled.
+    """
+
+    name = "contacts_wide"
+    primary_keys = ["contact_id"]
+
+    def __init__(self, tap, **kwargs) -> None:
+        tap.field_catalogue.load(lambda: FieldsStream(tap=tap).request_records(None))
+        fields = self._projected_fields(tap.field_catalogue, tap.config)
+        # Map the keys /contact/getdata returns to property names
+        self._field_properties: Dict[str, str] = {}
+        properties = [
+            th.Property("contact_id", th.NumberType),
+            th.Property("uid", th.StringType),
+        ]
+        for field in fields:
+            property_name = field["string_id"] or "field_{id}".format(id=field["id"])
+            if property_name in ("contact_id", "uid"):
                 continue
-            for transformed_record in transformed_records:
-                yield transformed_record
+            numeric = field["application_type"] == "numeric"
+            self._field_properties[str(field["id"])] = property_name
+            properties.append(
+                th.Property(property_name, th.NumberType if numeric else th.StringType)
+            )
+        super().__init__(
+            tap=tap, schema=th.PropertiesList(*properties).to_dict(), **kwargs
+        )
+
+    @property
+    def schema(self) -> dict:
+        return self._schema
+
+    @property
+    def field_ids(self) -> List[int]:
+        """Return the IDs of the fields whose properties are selected in the catalog."""
+        if self._field_ids is None:
+            self._field_ids = [
+                int(key)
+                for key, property_name in self._field_properties.items()
+                if self.mask.get(("properties", property_name), True)
+            ]
+        return self._field_ids
+
+    def contact_records(self, row: dict) -> Iterable[dict]:
+        record = {"contact_id": int(row["id"]), "uid": row["uid"]}
+        for key, value in row.items():
+            if key in self._field_properties:
+                record[self._field_properties[key]] = value
+        yield record
 
 
 class ContactListsStream(EmarsysStream):
@@ -188,7 +590,7 @@ class ContactListContactsStream(EmarsysStream):
     
     def post_process(self, row: dict, context: Optional[dict] = None) -> Optional[dict]:
         row["contact_id"] = row["id"]
-        return row
+        return super().post_process(row, context)
 
 
 class SegmentIdsStream(EmarsysStream):
@@ -272,23 +674,95 @@ class EmailCampaignsStream(EmarsysStream):
             "email_created_at": record["created"],
             "email_deleted_at": record["deleted"],
             "email_status": record["status"],
+            "email_fingerprint": self._fingerprint(record),
         }
 
-    def post_process(self, row: dict, context: Optional[dict] = None) -> Optional[dict]:
-        row["id"] = int(row["id"])
-        row["filter"] = int(row["filter"])
-        row["exclude_filter"] = int(row["exclude_filter"])
-        row["api_error"] = int(row["api_error"])
-        row["api_status"] = int(row["api_status"])
-        return row
+    def _fingerprint(self, record: dict) -> str:
+        """Return a digest of the campaign fields that say whether it has changed."""
+        values = [
+            record.get(field)
+            for field in self.config["email_campaign_fingerprint_fields"]
+        ]
+        return hashlib.md5(json.dumps(values, default=str).encode()).hexdigest()
 
 
-class EmailCampaignDetailsStream(EmarsysStream):
-    name = "email_campaign_details"
+class EmailCampaignChildStream(EmarsysStream):
+    """A stream requested once per email campaign.
+
+    Campaigns in one of `skip_statuses` are never requested. When the stream
+    sets `skip_unchanged` and `email_campaign_skip_unchanged` is enabled, the
+    campaign's fingerprint is kept in its state partition, and a sent or deleted
+    campaign is not requested again until its fingerprint changes.
+    """
+
     parent_stream_type = EmailCampaignsStream
     ignore_parent_replication_keys = True
+    state_partitioning_keys = ["email_campaign_id"]
+    skip_statuses: Tuple[str, ...] = ()
+    skip_unchanged = False
+    # Launched and deactivated campaigns are not edited any further
+    terminal_statuses = ("3", "-3")
+
+    @property
+    def _fingerprinted(self) -> bool:
+        return self.skip_unchanged and bool(
+            self.config.get("email_campaign_skip_unchanged")
+        )
+
+    def _partition_state_value(self, context: dict, key: str) -> Any:
+        """Return a value kept in the state partition of a campaign, if any.
+
+        State is only read here, since partitions may be requested from the
+        parent stream's executor while the main thread is writing state.
+        """
+        return get_state_if_exists(
+            self.tap_state,
+            self.name,
+            self._get_state_partition_context(context),
+            key=key,
+        )
+
+    def _skip_campaign(self, context: dict) -> bool:
+        """Return whether the campaign of a partition need not be requested."""
+        if context["email_status"] in self.skip_statuses:
+            return True
+        if not self._fingerprinted:
+            return False
+        if (
+            not context["email_deleted_at"]
+            and context["email_status"] not in self.terminal_statuses
+        ):
+            return False
+        fingerprint = self._partition_state_value(context, "fingerprint")
+        return fingerprint == context["email_fingerprint"]
+
+    def request_records(self, context: Optional[dict]) -> Iterable[dict]:
+        if self._skip_campaign(context):
+            self.logger.debug(
+                "Skipping campaign {campaign_id} sync.".format(
+                    campaign_id=context["email_campaign_id"]
+                )
+            )
+            return
+        yield from self.request_campaign_records(context)
+
+    def request_campaign_records(self, context: dict) -> Iterable[dict]:
+        """Request the records of a campaign that is not skipped."""
+        yield from super().request_records(context)
+
+    def get_records(self, context: Optional[dict]) -> Iterable[Dict[str, Any]]:
+        yield from super().get_records(context)
+        if self._fingerprinted:
+            # Only reached once every record of the campaign has been synced
+            fingerprint = context["email_fingerprint"]
+            self.get_context_state(context)["fingerprint"] = fingerprint
+
+
+class EmailCampaignDetailsStream(EmailCampaignChildStream):
+    name = "email_campaign_details"
     path = "/email/{email_campaign_id}/"
     primary_keys = ["id"]
+    skip_unchanged = True
     next_page_token_jsonpath = None
     records_jsonpath = "$.data"
 
@@ -310,14 +784,13 @@ class EmailCategoriesStream(EmarsysStream):
     ).to_dict()
 
     
-class EmailResponseSummariesStream(EmarsysStream):
+class EmailResponseSummariesStream(EmailCampaignChildStream):
     name = "email_response_summaries"
-    parent_stream_type = EmailCampaignsStream
-    ignore_parent_replication_keys = True
     path = "/email/{email_campaign_id}/responsesummary/"
     primary_keys = ["email_campaign_id", "date"]
-    state_partitioning_keys = ["email_campaign_id"]
     replication_key = "date"
+    # Campaigns in design or ready to launch have not been sent to anyone
+    skip_statuses = ("1", "4")
     next_page_token_jsonpath = None
     records_jsonpath = "$.data[*]"
 
@@ -337,172 +810,139 @@ class EmailResponseSummariesStream(EmarsysStream):
         th.Property("launches", th.NumberType),
     ).to_dict()
 
+    metrics = [
+        "sent", "planned", "soft_bounces", "hard_bounces", "block_bounces", "opened",
+        "unsubscribe", "total_clicks", "unique_clicks", "complained", "launches",
+    ]
+
     def get_url_params(
         self, context: Optional[dict], next_page_token: Optional[Any]
     ) -> Optional[dict]:
-        if isinstance(next_page_token, datetime.datetime):
-            start_date = next_page_token
-        else:
-            start_date = datetime.datetime.strptime(context["email_created_at"], "%Y-%m-%d %H:%M:%S")
-        deleted_date = datetime.datetime.strptime(context["email_deleted_at"], "%Y-%m-%d %H:%M:%S") if context["email_deleted_at"] else None
-        today = datetime.datetime.now(tz=start_date.tzinfo)
-        final_date = deleted_date if deleted_date else today
+        start_date, end_date = next_page_token
         params = {
             'start_date': start_date.strftime('%Y-%m-%d'),
-            'end_date': (
-                min(start_date + datetime.timedelta(days=1), final_date)
-            ).strftime('%Y-%m-%d'),
+            'end_date': end_date.strftime('%Y-%m-%d'),
         }
-        context["start_date"] = start_date.strftime('%Y-%m-%d')
         self.logger.debug(params)
         return params
 
-    def get_next_page_token(
-        self, response: requests.Response, previous_token: Optional[Any]
-    ) -> Optional[Any]:
-        """Return a token for identifying next page or None if no more pages."""
-        if self.next_page_token_jsonpath:
-            all_matches = extract_jsonpath(
-                self.next_page_token_jsonpath, response.json()
-            )
-            first_match = next(iter(all_matches), None)
-            next_page_token = first_match
-        elif response.headers.get("X-Next-Page", None):
-            next_page_token = response.headers.get("X-Next-Page", None)
-        else:
-            start_date = datetime.datetime.strptime(
-                parse_qs(urlparse(response.request.url).query)["start_date"][0],
-                "%Y-%m-%d"
-            )
-            end_date = datetime.datetime.strptime(
-                parse_qs(urlparse(response.request.url).query)["end_date"][0],
-                "%Y-%m-%d"
+    @staticmethod
+    def _final_date(context: dict) -> datetime.date:
+        """Return the last day of the campaign that has a summary."""
+        if context["email_deleted_at"]:
+            return datetime.datetime.strptime(
+                context["email_deleted_at"], "%Y-%m-%d %H:%M:%S"
+            ).date()
+        return datetime.date.today()
+
+    @staticmethod
+    def _parse_date(value: str) -> datetime.date:
+        return datetime.datetime.strptime(value[:10], "%Y-%m-%d").date()
+
+    def _bookmark_date(self, context: dict) -> Optional[datetime.date]:
+        """Return the date of the partition's bookmark, if it has one."""
+        bookmark = self._partition_state_value(context, "replication_key_value")
+        return self._parse_date(bookmark) if bookmark else None
+
+    def _first_date(
+        self, context: dict, final_date: datetime.date
+    ) -> Optional[datetime.date]:
+        """Return the first day of the campaign to request, or None to skip it."""
+        day = datetime.datetime.strptime(
+            context["email_created_at"], "%Y-%m-%d %H:%M:%S"
+        ).date()
+        bookmark = self._bookmark_date(context)
+        if bookmark:
+            if context["email_deleted_at"] and final_date <= bookmark:
+                self.logger.debug(
+                    "Skipping campaign {campaign_id} sync, deleted before its "
+                    "bookmark.".format(campaign_id=context["email_campaign_id"])
+                )
+                return None
+            lookback = datetime.timedelta(
+                days=self.config["email_response_summary_lookback_days"]
             )
-            if start_date.date() < end_date.date():
-                next_page_token = end_date
-            else:
-                next_page_token = None
-        return next_page_token
+            return max(day, bookmark - lookback)
+        if self.config.get("start_date"):
+            day = max(day, self._parse_date(self.config["start_date"]))
+            if day > final_date:
+                # Deleted before `start_date`
+                return None
+        return day
+
+    def _has_activity(self, rows: List[dict]) -> bool:
+        return any(
+            row.get(metric) for row in map(self.coerce, rows) for metric in self.metrics
+        )
 
     def post_process(self, row: dict, context: Optional[dict] = None) -> Optional[dict]:
-        row["date"] = context["start_date"]
-        row["email_campaign_id"] = int(context["email_campaign_id"])
-        row["planned"] = int(row["planned"])
-        row["total_clicks"] = int(row["total_clicks"])
-        row["unique_clicks"] = int(row["unique_clicks"])
-        row["sent"] = int(row["sent"])
-        row["soft_bounces"] = int(row["soft_bounces"])
-        row["hard_bounces"] = int(row["hard_bounces"])
-        row["block_bounces"] = int(row["block_bounces"])
-        row["opened"] = int(row["opened"])
-        row["unsubscribe"] = int(row["unsubscribe"])
-        row["complained"] = int(row["complained"])
-        row["launches"] = int(row["launches"])
-        return row
-
-    def get_records(self, context: Optional[dict] = None) -> Iterable[Dict[str, Any]]:
-        """Return a generator of row-type dictionary objects.
-        Each row emitted should be a dictionary of property names to their values.
-        """
-        if context["email_status"] in ('1', '4'):
-            self.logger.debug("Skipping campaign {campaign_id} sync.".format(campaign_id=context["email_campaign_id"]))
-            return []
-        return super().get_records(context)
-
-    def validate_response(self, response: requests.Response) -> None:
-        """Validate HTTP response.
-
-        By default, checks for error status codes (>400) and raises a
-        :class:`singer_sdk.exceptions.FatalAPIError`.
-
-        Tap developers are encouraged to override this method if their APIs use HTTP
-        status codes in non-conventional ways, or if they communicate errors
-        differently (e.g. in the response body).
-
-        .. image:: ../images/200.png
-
+        row["email_campaign_id"] = context["email_campaign_id"]
+        return super().post_process(row, context)
 
-        In case an error is deemed transient and can be safely retried, then this
-        method should raise an :class:`singer_sdk.exceptions.RetriableAPIError`.
+    def request_campaign_records(self, context: dict) -> Iterable[dict]:
+        """Request one summary row per day of the campaign.
 
-        Args:
-            response: A `requests.Response`_ object.
-
-        Raises:
-            FatalAPIError: If the request is not retriable.
-            RetriableAPIError: If the request is retriable.
-
-        .. _requests.Response:
-            https://docs.python-requests.org/en/latest/api/#requests.Response
-        """
-        if response.status_code == 401:
-            # print(response.content)
-            # print(response.request.url)
-            # print(response.request.headers)
-            msg = (
-                f"{response.status_code} Client Error: "
-                f"{response.reason} for path: {self.path}"
-            )
-            self._requests_session = None
-            raise RetriableAPIError(msg)
-        elif 400 <= response.status_code < 500:
-            msg = (
-                f"{response.status_code} Client Error: "
-                f"{response.reason} for path: {self.path}"
-            )
-            raise FatalAPIError(msg)
-        elif 500 <= response.status_code < 600:
-            msg = (
-                f"{response.status_code} Server Error: "
-                f"{response.reason} for path: {self.path}"
-            )
-            raise RetriableAPIError(msg)
+        Days before the partition's bookmark, less a lookback for late-arriving
+        stats, are not requested again, nor are days before `start_date` when
+        the partition has no bookmark. Days are requested in windows of
+        `email_response_summary_window_days`. Idle windows yield a zeroed row
+        per day without further requests, while windows with any activity are
+        requested again one day at a time.
 
-    def request_records(self, context: Optional[dict]) -> Iterable[dict]:
-        """Request records from REST endpoint(s), returning response records.
-        If pagination is detected, pages will be recursed automatically.
         Args:
             context: Stream partition or context dictionary.
+
         Yields:
-            An item for every record in the response.
-        Raises:
-            RuntimeError: If a loop in pagination is detected. That is, when two
-                consecutive pagination tokens are identical.
+            An item for every day of the campaign.
         """
-        next_page_token: Any = None
-        finished = False
+        one_day = datetime.timedelta(days=1)
+        window_size = datetime.timedelta(
+            days=self.config["email_response_summary_window_days"]
+        )
+        final_date = self._final_date(context)
+        day = self._first_date(context, final_date)
+        if day is None:
+            return
+        # Days before `daily_until` belong to a window that had activity, so are
+        # requested one at a time to get their daily breakdown.
+        daily_until = day
         decorated_request = self.request_decorator(self._request)
 
-        while not finished:
-            prepared_request = self.prepare_request(
-                context, next_page_token=next_page_token
-            )
-            try:
-                resp = decorated_request(prepared_request, context)
-            except RetriableAPIError as e:
-                print(e)
-                return self.request_records(context=context)
-            for row in self.parse_response(resp):
+        while True:
+            if day >= final_date:
+                window = (day, day)
+            elif day < daily_until or window_size <= one_day:
+                window = (day, day + one_day)
+            else:
+                window = (day, min(day + window_size, final_date))
+            prepared_request = self.prepare_request(context, next_page_token=window)
+            # Retries happen in place, so a failure resumes from this window
+            resp = decorated_request(prepared_request, context)
+            rows = list(self.parse_response(resp))
+            if window[1] - window[0] > one_day:
+                if self._has_activity(rows):
+                    daily_until = window[1]
+                    continue
+                # Counters are additive, so an idle window means idle days.
+                while day < window[1]:
+                    yield dict(
+                        dict.fromkeys(self.metrics, 0), date=day.strftime("%Y-%m-%d")
+                    )
+                    day += one_day
+                continue
+            for row in rows:
+                row["date"] = day.strftime('%Y-%m-%d')
                 yield row
-            previous_token = copy.deepcopy(next_page_token)
-            next_page_token = self.get_next_page_token(
-                response=resp, previous_token=previous_token
-            )
-            if next_page_token and next_page_token == previous_token:
-                raise RuntimeError(
-                    f"Loop detected in pagination. "
-                    f"Pagination token {next_page_token} is identical to prior token."
-                )
-            # Cycle until get_next_page_token() no longer returns a value
-            finished = not next_page_token
+            if day >= final_date:
+                break
+            day = window[1]
 
 
-class EmailCampaignTrackedLinksStream(EmarsysStream):
+class EmailCampaignTrackedLinksStream(EmailCampaignChildStream):
     name = "email_campaign_tracked_links"
-    parent_stream_type = EmailCampaignsStream
-    ignore_parent_replication_keys = True
     path = "/email/{email_campaign_id}/trackedlinks/"
     primary_keys = ["email_campaign_id", "id"]
+    skip_unchanged = True
     next_page_token_jsonpath = None
     records_jsonpath = "$.data[*]"
 
@@ -513,25 +953,3 @@ class EmailCampaignTrackedLinksStream(EmarsysStream):
         th.Property("url", th.StringType),
         th.Property("tracked_url", th.StringType),
     ).to_dict()
-
-
-    def validate_response(self, response: requests.Response) -> None:
-        if response.status_code == 401:
-            msg = (
-                f"{response.status_code} Client Error: "
-                f"{response.reason} for path: {self.path}"
-            )
-            self._requests_session = None
-            raise RetriableAPIError(msg)
-        elif 400 <= response.status_code < 500:
-            msg = (
-                f"{response.status_code} Client Error: "
-                f"{response.reason} for path: {self.path}"
-            )
-            raise FatalAPIError(msg)
-        elif 500 <= response.status_code < 600:
-            msg = (
-                f"{response.status_code} Server Error: "
-                f"{response.reason} for path: {self.path}"
-            )
-            raise RetriableAPIError(msg)
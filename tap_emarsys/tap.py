@@ -1,14 +1,26 @@
 """Emarsys tap class."""
 
-from typing import List
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Tuple
 
+import requests
+from requests.adapters import HTTPAdapter
+from singer import StateMessage
 from singer_sdk import Tap, Stream
 from singer_sdk import typing as th  # JSON schema typing helpers
+from singer_sdk.exceptions import ConfigValidationError
 
+from tap_emarsys.auth import WSSEAuthenticator
+from tap_emarsys.fields import FieldCatalogue
+from tap_emarsys.metrics import RequestMetrics
+from tap_emarsys.output import MessageWriter
+from tap_emarsys.ratelimit import RateLimiter
 from tap_emarsys.streams import (
     FieldsStream,
     ContactIdsStream,
     ContactFieldsStream,
+    ContactsWideStream,
     ContactListsStream,
     ContactListContactsStream,
     SegmentIdsStream,
@@ -58,8 +70,428 @@ class TapEmarsys(Tap):
             default="en",
             description="The language ID for data to be retrieved in"
         ),
+        th.Property(
+            "start_date",
+            th.DateTimeType,
+            description=(
+                "Earliest day synced by email_response_summaries for campaigns "
+                "without a bookmark, from their creation by default"
+            )
+        ),
+        th.Property(
+            "contact_batch_size",
+            th.IntegerType,
+            default=1000,
+            description=(
+                "Number of contacts requested per /contact/getdata call, "
+                "1 requests each contact individually"
+            )
+        ),
+        th.Property(
+            "contact_fields_skip_empty",
+            th.BooleanType,
+            default=False,
+            description="Whether contact_fields leaves out fields with no value"
+        ),
+        th.Property(
+            "contact_fields_include",
+            th.ArrayType(th.StringType),
+            description=(
+                "string_ids or IDs of the only fields requested for each contact, "
+                "all fields when empty"
+            )
+        ),
+        th.Property(
+            "contact_fields_exclude",
+            th.ArrayType(th.StringType),
+            description="string_ids or IDs of fields never requested for a contact"
+        ),
+        th.Property(
+            "contacts_wide",
+            th.BooleanType,
+            default=False,
+            description=(
+                "Whether to discover the contacts_wide stream, with one record per "
+                "contact and its schema built from the field catalogue"
+            )
+        ),
+        th.Property(
+            "contact_fields_export",
+            th.BooleanType,
+            default=False,
+            description=(
+                "Whether contact_fields is synced from one bulk export of "
+                "contact_export_segment_id instead of /contact/getdata"
+            )
+        ),
+        th.Property(
+            "contact_export_segment_id",
+            th.IntegerType,
+            description="Segment whose contacts are exported by contact_fields_export"
+        ),
+        th.Property(
+            "contact_export_poll_interval",
+            th.IntegerType,
+            default=10,
+            description="Seconds between checks on a contact export's status"
+        ),
+        th.Property(
+            "contact_export_timeout",
+            th.IntegerType,
+            default=3600,
+            description="Seconds to wait for a contact export to finish"
+        ),
+        th.Property(
+            "contact_page_size",
+            th.IntegerType,
+            default=10000,
+            description="Number of contact IDs listed per /contact/query/ call"
+        ),
+        th.Property(
+            "contact_modified_field",
+            th.StringType,
+            description=(
+                "string_id or ID of a date field holding the day each contact was "
+                "last modified, to only list contacts modified since the last run"
+            )
+        ),
+        th.Property(
+            "contact_checkpoint_pages",
+            th.IntegerType,
+            default=5,
+            description=(
+                "Number of contact pages between checkpoints of the listing offset, "
+                "from which an interrupted sync resumes, or 0 to never checkpoint"
+            )
+        ),
+        th.Property(
+            "max_workers",
+            th.IntegerType,
+            default=1,
+            description=(
+                "Number of child stream partitions, e.g. email campaigns, "
+                "or contact ID pages requested concurrently"
+            )
+        ),
+        th.Property(
+            "max_parallel_streams",
+            th.IntegerType,
+            default=1,
+            description=(
+                "Number of top-level streams, with their child streams, synced "
+                "concurrently"
+            )
+        ),
+        th.Property(
+            "email_campaign_skip_unchanged",
+            th.BooleanType,
+            default=False,
+            description=(
+                "Whether to skip the details and tracked links of sent or deleted "
+                "email campaigns whose fingerprint has not changed since the last sync"
+            )
+        ),
+        th.Property(
+            "email_campaign_fingerprint_fields",
+            th.ArrayType(th.StringType),
+            default=["status", "deleted", "template", "subject"],
+            description=(
+                "Email campaign fields a change of which invalidates its fingerprint"
+            ),
+        ),
+        th.Property(
+            "email_response_summary_window_days",
+            th.IntegerType,
+            default=30,
+            description=(
+                "Days covered by each email response summary request, days in "
+                "windows with activity are then requested one at a time"
+            )
+        ),
+        th.Property(
+            "email_response_summary_lookback_days",
+            th.IntegerType,
+            default=7,
+            description=(
+                "Days before each campaign's bookmark that are requested again to "
+                "pick up late-arriving stats"
+            )
+        ),
+        th.Property(
+            "requests_per_second",
+            th.NumberType,
+            description=(
+                "Maximum rate of requests to the Emarsys API across all streams, "
+                "unlimited by default apart from the quota the API reports"
+            )
+        ),
+        th.Property(
+            "max_request_attempts",
+            th.IntegerType,
+            default=5,
+            description=(
+                "Attempts made for each request before a transient error fails "
+                "the sync"
+            )
+        ),
+        th.Property(
+            "http_pool_size",
+            th.IntegerType,
+            default=10,
+            description="Maximum number of pooled connections to the Emarsys API"
+        ),
+        th.Property(
+            "http_keep_alive",
+            th.BooleanType,
+            default=True,
+            description="Whether connections are kept open between requests"
+        ),
+        th.Property(
+            "http_timeout",
+            th.IntegerType,
+            default=300,
+            description="Seconds to wait for the Emarsys API to respond"
+        ),
+        th.Property(
+            "metrics_log_interval",
+            th.IntegerType,
+            default=60,
+            description=(
+                "Seconds between logs of the request and record metrics of each "
+                "stream and endpoint, or 0 to only log them at the end of the run"
+            )
+        ),
+        th.Property(
+            "output_buffer_size",
+            th.IntegerType,
+            default=1048576,
+            description=(
+                "Characters of Singer messages buffered before they are written to "
+                "stdout, or 0 to write each message as it comes"
+            )
+        ),
+        th.Property(
+            "output_flush_interval",
+            th.NumberType,
+            default=1,
+            description=(
+                "Maximum seconds a message is buffered before it is written to "
+                "stdout, even while no other messages come"
+            )
+        ),
+        th.Property(
+            "skip_record_validation",
+            th.BooleanType,
+            default=False,
+            description=(
+                "Whether records of contact_fields and contacts_wide, which are built "
+                "with their schema types, are written without conforming them again"
+            )
+        ),
+        th.Property(
+            "field_cache_path",
+            th.StringType,
+            description=(
+                "Optional file in which to persist the field catalogue between runs"
+            )
+        ),
+        th.Property(
+            "field_cache_ttl",
+            th.IntegerType,
+            default=86400,
+            description="Seconds for which a persisted field catalogue is reused"
+        ),
     ).to_dict()
 
+    def __init__(self, *args, **kwargs) -> None:
+        self._field_catalogue: Optional[FieldCatalogue] = None
+        self._requests_session: Optional[requests.Session] = None
+        self._rate_limiter: Optional[RateLimiter] = None
+        self._request_metrics: Optional[RequestMetrics] = None
+        self._wsse_authenticator: Optional[WSSEAuthenticator] = None
+        self._message_writer: Optional[MessageWriter] = None
+        # Set when a stream fails, so that streams synced concurrently stop too
+        self.stop_event = threading.Event()
+        super().__init__(*args, **kwargs)
+
+    @property
+    def rate_limiter(self) -> RateLimiter:
+        """Return the rate limiter shared by all streams of this tap."""
+        if self._rate_limiter is None:
+            self._rate_limiter = RateLimiter(self.config.get("requests_per_second"))
+        return self._rate_limiter
+
+    @property
+    def wsse_authenticator(self) -> WSSEAuthenticator:
+        """Return the authenticator signing all requests of this tap."""
+        if self._wsse_authenticator is None:
+            self._wsse_authenticator = WSSEAuthenticator(
+                self.config["username"], self.config["secret"]
+            )
+        return self._wsse_authenticator
+
+    @property
+    def message_writer(self) -> MessageWriter:
+        """Return the writer of the Singer messages of all streams of this tap."""
+        if self._message_writer is None:
+            self._message_writer = MessageWriter(
+                buffer_size=self.config["output_buffer_size"],
+                flush_interval=self.config["output_flush_interval"],
+            )
+        return self._message_writer
+
+    @property
+    def request_metrics(self) -> RequestMetrics:
+        """Return the request and record metrics of this tap run."""
+        if self._request_metrics is None:
+            self._request_metrics = RequestMetrics(
+                self.logger, interval=self.config.get("metrics_log_interval")
+            )
+        return self._request_metrics
+
+    @property
+    def requests_session(self) -> requests.Session:
+        """Return the connection-pooled session shared by all streams of this tap."""
+        if self._requests_session is None:
+            session = requests.Session()
+            # Block rather than open throwaway connections once the pool is in use
+            adapter = HTTPAdapter(
+                pool_maxsize=self.config["http_pool_size"], pool_block=True
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            if not self.config["http_keep_alive"]:
+                session.headers["Connection"] = "close"
+            self._requests_session = session
+        return self._requests_session
+
+    @property
+    def field_catalogue(self) -> FieldCatalogue:
+        """Return the field catalogue shared by all streams of this tap."""
+        if self._field_catalogue is None:
+            self._field_catalogue = FieldCatalogue(
+                language_id=self.config["language_id"],
+                cache_path=self.config.get("field_cache_path"),
+                ttl=self.config["field_cache_ttl"],
+            )
+        return self._field_catalogue
+
+    def _validate_config(
+        self, raise_errors: bool = True, warnings_as_errors: bool = False
+    ) -> Tuple[List[str], List[str]]:
+        """Validate the config, including settings that depend on each other."""
+        warnings, errors = super()._validate_config(raise_errors, warnings_as_errors)
+        if (
+            self.config.get("contact_fields_export")
+            and self.config.get("contact_export_segment_id") is None
+        ):
+            error = (
+                "contact_export_segment_id is required when contact_fields_export "
+                "is set"
+            )
+            if raise_errors:
+                raise ConfigValidationError(error)
+            errors.append(error)
+        return warnings, errors
+
+    def load_state(self, state: Dict[str, Any]) -> None:
+        """Load state, dropping partitions keyed differently by earlier versions."""
+        super().load_state(state)
+        for stream_class in STREAM_TYPES + [ContactsWideStream]:
+            keys = stream_class.state_partitioning_keys
+            stream_state = self.state.get("bookmarks", {}).get(stream_class.name)
+            if not isinstance(keys, list) or not stream_state:
+                continue
+            partitions = [
+                partition
+                for partition in stream_state.get("partitions", [])
+                if set(partition["context"]) == set(keys)
+            ]
+            if partitions:
+                stream_state["partitions"] = partitions
+            else:
+                stream_state.pop("partitions", None)
+
+    def sync_all(self) -> None:
+        """Sync all streams, then log the metrics of the run."""
+        try:
+            if self.config["max_parallel_streams"] > 1:
+                self._sync_all_parallel()
+            else:
+                super().sync_all()
+        finally:
+            self.message_writer.close()
+            self.request_metrics.log_summary()
+
+    def _sync_all_parallel(self) -> None:
+        """Sync the trees of selected top-level streams concurrently.
+
+        Each top-level stream is synced with its children from one thread, as
+        the SDK would sequentially, and up to `max_parallel_streams` of them at
+        once. Their requests share the rate limiter and connection pool, and
+        their messages are written whole by the `message_writer`. The first tree
+        to fail is logged at once and sets the `stop_event`, so the others fail
+        at their next request rather than running to completion.
+        """
+        self._reset_state_progress_markers()
+        self._set_compatible_replication_methods()
+        top_level_streams = self._selected_top_level_streams()
+        # Shared clients are created lazily, so create them before threads race to
+        for name in (
+            "rate_limiter",
+            "requests_session",
+            "wsse_authenticator",
+            "request_metrics",
+            "message_writer",
+            "field_catalogue",
+        ):
+            getattr(self, name)
+
+        max_workers = self.config["max_parallel_streams"]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(self._sync_tree, stream) for stream in top_level_streams
+            ]
+            try:
+                for future in as_completed(futures):
+                    future.result()
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+        # Trees finish in any order, so no stream's last state has the final
+        # bookmarks of every tree
+        self.message_writer.write_message(StateMessage(value=self.state))
+
+    def _selected_top_level_streams(self) -> List[Stream]:
+        """Return the top-level streams with anything selected, creating all state."""
+        top_level_streams = []
+        for stream in self.streams.values():
+            # Create every bookmark now rather than while other threads write state
+            stream.stream_state
+            if not stream.selected and not stream.has_selected_descendents:
+                self.logger.info(f"Skipping deselected stream '{stream.name}'.")
+            elif not stream.parent_stream_type:
+                top_level_streams.append(stream)
+        return top_level_streams
+
+    def _sync_tree(self, stream: Stream) -> None:
+        """Sync a top-level stream and its children, stopping the run if it fails."""
+        try:
+            stream.sync()
+        except BaseException:
+            if not self.stop_event.is_set():
+                self.stop_event.set()
+                self.logger.exception(
+                    f"Stream '{stream.name}' failed, stopping the other streams."
+                )
+            raise
+        stream.finalize_state_progress_markers()
+
     def discover_streams(self) -> List[Stream]:
         """Return a list of discovered streams."""
-        return [stream_class(tap=self) for stream_class in STREAM_TYPES]
+        streams = [stream_class(tap=self) for stream_class in STREAM_TYPES]
+        if self.config.get("contacts_wide"):
+            # Discovering this stream requests the field catalogue
+            streams.append(ContactsWideStream(tap=self))
+        return streams
@@ -0,0 +1,469 @@
+"""A local stand-in for the Emarsys API, for offline tests and benchmarks."""
+
+import base64
+import csv
+import datetime
+import hashlib
+import io
+import json
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+API_PREFIX = "/api/v2"
+# A date field holding the day each contact was last modified, see `modified_days`
+MODIFIED_FIELD_ID = 100
+SUMMARY_METRICS = [
+    "sent",
+    "planned",
+    "soft_bounces",
+    "hard_bounces",
+    "block_bounces",
+    "opened",
+    "unsubscribe",
+    "total_clicks",
+    "unique_clicks",
+    "complained",
+    "launches",
+]
+
+
+class FakeEmarsysAPI:
+    """Synthetic Emarsys account served over HTTP on a local port.
+
+    Data volumes are set by the constructor arguments and generated on demand,
+    so large accounts cost no memory up front. `latency` delays every response,
+    `max_page_size` caps the `limit` of a `/contact/query/` call, which matches
+    field values given as query parameters exactly. With `modified_days` the
+    catalogue has a `last_modified` date field, with contacts modified up to that
+    many days ago. `failures`
+    maps a status code such as 401, 429 or 503 to N to fail every Nth request
+    with it. When `secret` is set, X-WSSE tokens are checked like the API does:
+    a wrong digest, a token created over 5 minutes ago or a reused nonce get a
+    401. Requests per route and bytes sent are counted in `requests` and
+    `bytes_sent`.
+    """
+
+    def __init__(
+        self,
+        contacts: int = 1000,
+        fields: int = 20,
+        contact_lists: int = 5,
+        contact_list_size: int = 100,
+        segments: int = 5,
+        campaigns: int = 10,
+        campaign_days: int = 30,
+        latency: float = 0.0,
+        max_page_size: int = 10000,
+        failures: Optional[Dict[int, int]] = None,
+        secret: Optional[str] = None,
+        modified_days: Optional[int] = None,
+    ) -> None:
+        self.contacts = contacts
+        self.fields = fields
+        self.contact_lists = contact_lists
+        self.contact_list_size = contact_list_size
+        self.segments = segments
+        self.campaigns = campaigns
+        self.campaign_days = campaign_days
+        self.latency = latency
+        self.max_page_size = max_page_size
+        self.failures = failures or {}
+        self.secret = secret
+        self.modified_days = modified_days
+        self.nonces: set = set()
+        self.requests: Counter = Counter()
+        self.bytes_sent = 0
+        self._request_count = 0
+        self._lock = threading.Lock()
+        self._server: Optional[_Server] = None
+        self._routes: List[Tuple[str, re.Pattern, Callable[..., Any]]] = [
+            ("GET", re.compile(r"/field/translate/(\w+)"), self.field_translate),
+            ("GET", re.compile(r"/contact/query/"), self.contact_query),
+            ("POST", re.compile(r"/contact/getdata"), self.contact_getdata),
+            ("GET", re.compile(r"/contactlist"), self.contact_list_index),
+            (
+                "GET",
+                re.compile(r"/contactlist/(\d+)/contacts/data"),
+                self.contact_list_contacts,
+            ),
+            ("GET", re.compile(r"/filter"), self.segment_index),
+            ("GET", re.compile(r"/filter/(\d+)"), self.segment),
+            ("GET", re.compile(r"/email"), self.email_index),
+            ("GET", re.compile(r"/email/(\d+)/"), self.email),
+            (
+                "GET",
+                re.compile(r"/email/(\d+)/responsesummary/"),
+                self.email_response_summary,
+            ),
+            (
+                "GET",
+                re.compile(r"/email/(\d+)/trackedlinks/"),
+                self.email_tracked_links,
+            ),
+            ("GET", re.compile(r"/emailcategory"), self.email_categories),
+            ("POST", re.compile(r"/export/filter"), self.export_filter),
+            ("GET", re.compile(r"/export/(\d+)"), self.export_status),
+            ("GET", re.compile(r"/export/(\d+)/data"), self.export_data),
+        ]
+
+    # Server lifecycle
+
+    @property
+    def url_base(self) -> str:
+        return "http://127.0.0.1:{port}{prefix}".format(
+            port=self._server.server_port, prefix=API_PREFIX
+        )
+
+    @property
+    def total_requests(self) -> int:
+        return sum(self.requests.values())
+
+    def start(self) -> "FakeEmarsysAPI":
+        api = self
+
+        class Handler(_Handler):
+            fake_api = api
+
+        self._server = _Server(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "FakeEmarsysAPI":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    # Request dispatch
+
+    def handle(
+        self, method: str, url: str, headers: Dict[str, str], body: Optional[bytes]
+    ) -> Tuple[int, Dict[str, str], bytes]:
+        """Return the status, headers and body of the response to a request."""
+        if self.latency:
+            time.sleep(self.latency)
+        parsed = urlparse(url)
+        path = parsed.path.replace(API_PREFIX, "", 1)
+        for route_method, pattern, view in self._routes:
+            match = pattern.fullmatch(path)
+            if route_method == method and match:
+                break
+        else:
+            return self._json(404, {"replyCode": 1, "replyText": "Not found"})
+        with self._lock:
+            self.requests[pattern.pattern] += 1
+            self._request_count += 1
+            request_count = self._request_count
+        if not self._authenticated(headers.get("X-WSSE")):
+            return self._json(401, {"replyCode": 1, "replyText": "Unauthorized"})
+        for status, every in self.failures.items():
+            if request_count % every == 0:
+                response_headers = {"Retry-After": "0"} if status == 429 else {}
+                return self._json(
+                    status, {"replyCode": 1, "replyText": "Injected"}, response_headers
+                )
+        query = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+        payload = json.loads(body) if body else None
+        result = view(*match.groups(), query=query, payload=payload)
+        if isinstance(result, str):
+            return 200, {"Content-Type": "text/csv"}, result.encode()
+        return self._json(200, {"replyCode": 0, "replyText": "OK", "data": result})
+
+    def _authenticated(self, token: Optional[str]) -> bool:
+        if token is None:
+            return False
+        if self.secret is None:
+            return True
+        parts = dict(re.findall(r'(\w+)="([^"]*)"', token))
+        digest = base64.b64encode(
+            hashlib.sha1((parts["Nonce"] + parts["Created"] + self.secret).encode())
+            .hexdigest()
+            .encode()
+        ).decode()
+        created = datetime.datetime.strptime(parts["Created"], "%Y-%m-%dT%H:%M:%SZ")
+        with self._lock:
+            replayed = parts["Nonce"] in self.nonces
+            self.nonces.add(parts["Nonce"])
+        return (
+            parts["PasswordDigest"] == digest
+            and abs((datetime.datetime.utcnow() - created).total_seconds()) <= 300
+            and not replayed
+        )
+
+    @staticmethod
+    def _json(
+        status: int, body: Any, headers: Optional[Dict[str, str]] = None
+    ) -> Tuple[int, Dict[str, str], bytes]:
+        return (
+            status,
+            dict(headers or {}, **{"Content-Type": "application/json"}),
+            json.dumps(body).encode(),
+        )
+
+    # Synthetic data
+
+    def _field_ids(self) -> List[int]:
+        field_ids = list(range(1, self.fields + 1))
+        if self.modified_days:
+            field_ids.append(MODIFIED_FIELD_ID)
+        return field_ids
+
+    def _field_value(self, contact_id: int, field_id: int) -> Optional[str]:
+        if field_id == MODIFIED_FIELD_ID and self.modified_days:
+            return (
+                datetime.date.today()
+                - datetime.timedelta(days=contact_id % self.modified_days)
+            ).isoformat()
+        if (contact_id + field_id) % 4 == 0:
+            return None
+        if field_id % 3 == 0:
+            return str(contact_id * field_id)
+        return "value {contact_id}-{field_id}".format(
+            contact_id=contact_id, field_id=field_id
+        )
+
+    def _contact_row(self, contact_id: int, field_ids: List[int]) -> dict:
+        row = {"id": str(contact_id), "uid": "uid{id}".format(id=contact_id)}
+        for field_id in field_ids:
+            row[str(field_id)] = self._field_value(contact_id, field_id)
+        return row
+
+    def _campaign_created(self, campaign_id: int) -> datetime.date:
+        return datetime.date.today() - datetime.timedelta(
+            days=self.campaign_days - 1 + campaign_id % 3
+        )
+
+    def _daily_summary(self, campaign_id: int, day: datetime.date) -> Dict[str, int]:
+        """Campaigns send on the day they are created and see opens for a week."""
+        age = (day - self._campaign_created(campaign_id)).days
+        summary = dict.fromkeys(SUMMARY_METRICS, 0)
+        if age == 0:
+            summary.update(sent=self.contacts, planned=self.contacts, launches=1)
+        if 0 <= age < 7:
+            summary.update(
+                opened=max(self.contacts // (age + 2), 1),
+                total_clicks=7 - age,
+                unique_clicks=1,
+            )
+        return summary
+
+    # Routes
+
+    def field_translate(self, language_id: str, **kwargs) -> List[dict]:
+        fields = [
+            {
+                "id": field_id,
+                "name": "Field {id}".format(id=field_id),
+                "application_type": "numeric" if field_id % 3 == 0 else "shorttext",
+                "string_id": "field_{id}".format(id=field_id),
+            }
+            for field_id in range(1, self.fields + 1)
+        ]
+        if self.modified_days:
+            fields.append(
+                {
+                    "id": MODIFIED_FIELD_ID,
+                    "name": "Last Modified",
+                    "application_type": "date",
+                    "string_id": "last_modified",
+                }
+            )
+        return fields
+
+    def contact_query(self, query: dict, **kwargs) -> dict:
+        offset = int(query.get("offset", 0))
+        limit = min(int(query.get("limit", self.max_page_size)), self.max_page_size)
+        conditions = {int(key): value for key, value in query.items() if key.isdigit()}
+        contact_ids = (
+            [
+                contact_id
+                for contact_id in range(1, self.contacts + 1)
+                if all(
+                    self._field_value(contact_id, field_id) == value
+                    for field_id, value in conditions.items()
+                )
+            ]
+            if conditions
+            else range(1, self.contacts + 1)
+        )
+        page = contact_ids[offset:][:limit]
+        return {"result": [{"id": str(contact_id)} for contact_id in page] or False}
+
+    def contact_getdata(self, payload: dict, **kwargs) -> dict:
+        field_ids = [
+            int(field_id) for field_id in payload.get("fields") or self._field_ids()
+        ]
+        result, errors = [], []
+        for key in payload["keyValues"]:
+            contact_id = int(key)
+            if 1 <= contact_id <= self.contacts:
+                result.append(self._contact_row(contact_id, field_ids))
+            else:
+                errors.append(
+                    {"key": str(key), "errorCode": 2008, "errorMsg": "No contact found"}
+                )
+        # The API answers `false` rather than an empty list
+        return {"result": result or False, "errors": errors}
+
+    def contact_list_index(self, **kwargs) -> List[dict]:
+        return [
+            {
+                "id": list_id,
+                "name": "List {id}".format(id=list_id),
+                "created": "2021-01-01 00:00:00",
+                "type": 0,
+            }
+            for list_id in range(1, self.contact_lists + 1)
+        ]
+
+    def contact_list_contacts(self, list_id: str, **kwargs) -> List[dict]:
+        start = int(list_id) * self.contact_list_size
+        return [
+            {"fields": {"id": contact_id, "uid": "uid{id}".format(id=contact_id)}}
+            for contact_id in range(start, start + self.contact_list_size)
+        ]
+
+    def segment_index(self, **kwargs) -> List[dict]:
+        return [
+            {"id": segment_id, "predefinedSegmentId": None}
+            for segment_id in range(1, self.segments + 1)
+        ]
+
+    def segment(self, segment_id: str, **kwargs) -> dict:
+        return {
+            "id": int(segment_id),
+            "name": "Segment {id}".format(id=segment_id),
+            "type": "contact",
+            "tags": [],
+            "base_contact_list_id": 0,
+            "criteria_types": ["profile"],
+        }
+
+    def email_index(self, **kwargs) -> List[dict]:
+        return [
+            {
+                "id": str(campaign_id),
+                "language": "en",
+                "created": "{day} 09:00:00".format(
+                    day=self._campaign_created(campaign_id)
+                ),
+                "deleted": None,
+                "name": "Campaign {id}".format(id=campaign_id),
+                "status": "3",
+                "api_status": "0",
+                "api_error": "0",
+                "filter": "0",
+                "exclude_filter": "0",
+                "template": str(campaign_id % 4),
+                "subject": "Subject {id}".format(id=campaign_id),
+            }
+            for campaign_id in range(1, self.campaigns + 1)
+        ]
+
+    def email(self, campaign_id: str, **kwargs) -> dict:
+        return {"id": int(campaign_id), "additional_linktracking_parameters": ""}
+
+    def email_response_summary(self, campaign_id: str, query: dict, **kwargs) -> dict:
+        start = datetime.date.fromisoformat(query["start_date"])
+        end = datetime.date.fromisoformat(query["end_date"])
+        summary = dict.fromkeys(SUMMARY_METRICS, 0)
+        day = start
+        while True:
+            for metric, value in self._daily_summary(int(campaign_id), day).items():
+                summary[metric] += value
+            day += datetime.timedelta(days=1)
+            if day >= end:
+                break
+        return {metric: str(value) for metric, value in summary.items()}
+
+    def email_tracked_links(self, campaign_id: str, **kwargs) -> List[dict]:
+        return [
+            {
+                "id": link_id,
+                "section_id": 1,
+                "url": "https://example.com/{campaign}/{link}".format(
+                    campaign=campaign_id, link=link_id
+                ),
+                "tracked_url": "https://link.example.com/{campaign}/{link}".format(
+                    campaign=campaign_id, link=link_id
+                ),
+            }
+            for link_id in range(1, 6)
+        ]
+
+    def email_categories(self, **kwargs) -> List[dict]:
+        return [
+            {"id": category_id, "category": "Category {id}".format(id=category_id)}
+            for category_id in range(1, 4)
+        ]
+
+    def export_filter(self, payload: dict, **kwargs) -> dict:
+        self._export_fields = [int(field_id) for field_id in payload["contact_fields"]]
+        return {"id": 1}
+
+    def export_status(self, export_id: str, **kwargs) -> dict:
+        return {"id": int(export_id), "status": "done"}
+
+    def export_data(self, export_id: str, **kwargs) -> str:
+        field_ids = getattr(self, "_export_fields", self._field_ids())
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(
+            ["user_id", "uid"]
+            + ["Field {id}".format(id=field_id) for field_id in field_ids]
+        )
+        for contact_id in range(1, self.contacts + 1):
+            row = self._contact_row(contact_id, field_ids)
+            writer.writerow(
+                [row["id"], row["uid"]]
+                + [row[str(field_id)] or "" for field_id in field_ids]
+            )
+        return output.getvalue()
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address) -> None:
+        # Clients closing pooled connections at the end of a run are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    fake_api: FakeEmarsysAPI
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else None
+        status, headers, payload = self.fake_api.handle(
+            self.command, self.path, dict(self.headers), body
+        )
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+        with self.fake_api._lock:
+            self.fake_api.bytes_sent += len(payload)
+
+    do_GET = _respond
+    do_POST = _respond
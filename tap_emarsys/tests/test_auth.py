@@ -0,0 +1,71 @@
+"""Tests for WSSE request signing."""
+
+import base64
+import contextlib
+import hashlib
+import io
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tap_emarsys.auth import WSSEAuthenticator
+from tap_emarsys.client import EmarsysStream
+from tap_emarsys.tap import TapEmarsys
+from tap_emarsys.tests.fake_api import FakeEmarsysAPI
+
+
+def test_header_digest():
+    """The header carries the digest of its own nonce and timestamp."""
+    header = WSSEAuthenticator("user", "secret").header()
+    parts = dict(re.findall(r'(\w+)="([^"]*)"', header))
+
+    assert header.startswith('UsernameToken Username="user", PasswordDigest="')
+    assert re.fullmatch(r"[0-9a-f]{32}", parts["Nonce"])
+    assert re.fullmatch(r"\d{4}-\d\d-\d\dT\d\d:\d\d:\d\dZ", parts["Created"])
+    assert (
+        parts["PasswordDigest"]
+        == base64.b64encode(
+            hashlib.sha1((parts["Nonce"] + parts["Created"] + "secret").encode())
+            .hexdigest()
+            .encode()
+        ).decode()
+    )
+
+
+def test_nonces_are_unique_across_threads():
+    authenticator = WSSEAuthenticator("user", "secret")
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        nonces = list(executor.map(lambda _: authenticator.nonce(), range(10000)))
+    assert len(set(nonces)) == len(nonces)
+
+
+def test_retried_requests_are_signed_again(monkeypatch):
+    """Retries after 401 and 5xx responses carry a new token and then succeed."""
+    monkeypatch.setattr(time, "sleep", lambda seconds: None)
+    with FakeEmarsysAPI(
+        contacts=300, fields=3, secret="secret", failures={401: 4, 503: 5}
+    ) as api:
+        monkeypatch.setattr(EmarsysStream, "url_base", api.url_base)
+        tap = TapEmarsys(
+            config={
+                "username": "user",
+                "secret": "secret",
+                "contact_page_size": 100,
+                "contact_batch_size": 50,
+            },
+            parse_env_config=False,
+        )
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            tap.streams["contact_ids"].sync()
+
+    messages = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert (
+        sum(
+            message["type"] == "RECORD" and message["stream"] == "contact_fields"
+            for message in messages
+        )
+        == 300 * 3
+    )
+    assert len(api.nonces) == api.total_requests
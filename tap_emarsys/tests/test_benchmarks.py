@@ -0,0 +1,210 @@
+"""Benchmarks of each stream against a local stand-in for the Emarsys API.
+
+Run with `pytest tap_emarsys/tests/test_benchmarks.py`. Alongside timings,
+each benchmark reports records per second, requests per record and the peak
+memory allocated during a run in its `extra_info`.
+"""
+
+import contextlib
+import io
+import json
+import time
+import tracemalloc
+from collections import Counter
+from typing import Optional
+
+import pytest
+
+from tap_emarsys.client import EmarsysStream
+from tap_emarsys.tap import TapEmarsys
+from tap_emarsys.tests.fake_api import FakeEmarsysAPI
+
+pytest.importorskip("pytest_benchmark")
+
+CONTACTS = 1000
+FIELDS = 20
+CAMPAIGNS = 10
+CAMPAIGN_DAYS = 30
+BASE_CONFIG = {
+    "username": "user",
+    "secret": "secret",
+    "contact_page_size": 500,
+}
+EXPECTED_RECORDS = {
+    "fields": FIELDS,
+    "contact_ids": CONTACTS,
+    "contact_fields": CONTACTS * FIELDS,
+    "contacts_wide": CONTACTS,
+    "contact_lists": 5,
+    "contact_list_contacts": 5 * 100,
+    "segment_ids": 5,
+    "segments": 5,
+    "email_campaigns": CAMPAIGNS,
+    "email_campaign_details": CAMPAIGNS,
+    "email_campaign_tracked_links": CAMPAIGNS * 5,
+    "email_categories": 3,
+    # One summary per day, from the day each campaign was created until today
+    "email_response_summaries": sum(
+        CAMPAIGN_DAYS + campaign_id % 3 for campaign_id in range(1, CAMPAIGNS + 1)
+    ),
+}
+
+
+def _catalog(config: dict, stream_name: str) -> dict:
+    """Return a catalog selecting only `stream_name`."""
+    catalog = TapEmarsys(config=config, parse_env_config=False).catalog_dict
+    for entry in catalog["streams"]:
+        for metadata in entry["metadata"]:
+            if not metadata["breadcrumb"]:
+                metadata["metadata"]["selected"] = entry["tap_stream_id"] == stream_name
+    return catalog
+
+
+def sync_stream(api: FakeEmarsysAPI, stream_name: Optional[str], config: dict) -> dict:
+    """Sync one stream, or all of them, against `api` and return the run's stats."""
+    config = dict(BASE_CONFIG, **config)
+    catalog = _catalog(config, stream_name) if stream_name else None
+    tap = TapEmarsys(config=config, catalog=catalog, parse_env_config=False)
+    requests_before = api.total_requests
+    records: Counter = Counter()
+    output = io.StringIO()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        tap.sync_all()
+    elapsed = time.perf_counter() - started
+    for line in output.getvalue().splitlines():
+        message = json.loads(line)
+        if message["type"] == "RECORD":
+            records[message["stream"]] += 1
+    requests = api.total_requests - requests_before
+    record_count = records[stream_name] if stream_name else sum(records.values())
+    return {
+        "records": record_count,
+        "records_per_second": record_count / elapsed,
+        "requests": requests,
+        "requests_per_record": requests / max(record_count, 1),
+    }
+
+
+def peak_memory_kb(
+    api: FakeEmarsysAPI, stream_name: Optional[str], config: dict
+) -> int:
+    """Return the peak memory allocated by Python while syncing, in KiB.
+
+    The sync is run again for this, as tracing allocations slows it down too much
+    to time. The fake API shares the process, so its responses are included.
+    """
+    tracemalloc.start()
+    try:
+        sync_stream(api, stream_name, config)
+        return tracemalloc.get_traced_memory()[1] // 1024
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.fixture
+def fake_api(request, monkeypatch):
+    options = getattr(request, "param", {})
+    with FakeEmarsysAPI(
+        contacts=CONTACTS,
+        fields=FIELDS,
+        campaigns=CAMPAIGNS,
+        campaign_days=CAMPAIGN_DAYS,
+        **options
+    ) as api:
+        monkeypatch.setattr(EmarsysStream, "url_base", api.url_base)
+        yield api
+
+
+def run_benchmark(
+    benchmark, api: FakeEmarsysAPI, stream_name: Optional[str], config: dict
+) -> dict:
+    stats = benchmark.pedantic(
+        sync_stream, args=(api, stream_name, config), rounds=3, iterations=1
+    )
+    if not benchmark.disabled:
+        stats["peak_memory_kb"] = peak_memory_kb(api, stream_name, config)
+    benchmark.extra_info.update(stats)
+    return stats
+
+
+@pytest.mark.parametrize(
+    "stream_name", sorted(set(EXPECTED_RECORDS) - {"contacts_wide"})
+)
+def test_stream_benchmark(benchmark, fake_api, stream_name):
+    """Each stream syncs every record of the synthetic account."""
+    stats = run_benchmark(benchmark, fake_api, stream_name, {})
+    assert stats["records"] == EXPECTED_RECORDS[stream_name]
+
+
+@pytest.mark.parametrize(
+    "stream_name, config",
+    [
+        ("contact_fields", {"max_workers": 4}),
+        (
+            "contact_fields",
+            {
+                "contact_fields_export": True,
+                "contact_export_segment_id": 1,
+                "contact_export_poll_interval": 0,
+            },
+        ),
+        ("contact_fields", {"output_buffer_size": 0}),
+        ("contact_fields", {"skip_record_validation": True}),
+        ("contacts_wide", {"contacts_wide": True}),
+        ("email_response_summaries", {"max_workers": 4}),
+    ],
+    ids=[
+        "contact_fields-parallel",
+        "contact_fields-export",
+        "contact_fields-unbuffered",
+        "contact_fields-skip-validation",
+        "contacts_wide",
+        "email_response_summaries-parallel",
+    ],
+)
+def test_configured_stream_benchmark(benchmark, fake_api, stream_name, config):
+    """Alternative ways of syncing a stream return the same records."""
+    stats = run_benchmark(benchmark, fake_api, stream_name, config)
+    assert stats["records"] == EXPECTED_RECORDS[stream_name]
+
+
+@pytest.mark.parametrize("fake_api", [{"latency": 0.005}], indirect=True)
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_latency_benchmark(benchmark, fake_api, max_workers):
+    """Concurrent partitions hide the latency of the API."""
+    stats = run_benchmark(
+        benchmark,
+        fake_api,
+        "email_campaign_tracked_links",
+        {"max_workers": max_workers},
+    )
+    assert stats["records"] == EXPECTED_RECORDS["email_campaign_tracked_links"]
+
+
+@pytest.mark.parametrize("fake_api", [{"latency": 0.005}], indirect=True)
+@pytest.mark.parametrize("max_parallel_streams", [1, 4])
+def test_parallel_streams_benchmark(benchmark, fake_api, max_parallel_streams):
+    """Stream trees synced concurrently take about as long as the slowest one."""
+    stats = run_benchmark(
+        benchmark, fake_api, None, {"max_parallel_streams": max_parallel_streams}
+    )
+    assert stats["records"] == sum(
+        count
+        for stream_name, count in EXPECTED_RECORDS.items()
+        if stream_name != "contacts_wide"
+    )
+
+
+@pytest.mark.parametrize(
+    "fake_api", [{"failures": {401: 7, 429: 11, 503: 13}}], indirect=True
+)
+def test_failure_benchmark(benchmark, fake_api, monkeypatch):
+    """Injected 401, 429 and 5xx responses are retried without losing records."""
+    # Retries are counted rather than waited for
+    monkeypatch.setattr(time, "sleep", lambda seconds: None)
+    stats = run_benchmark(
+        benchmark, fake_api, "contact_fields", {"contact_batch_size": 100}
+    )
+    assert stats["records"] == EXPECTED_RECORDS["contact_fields"]
+    assert stats["requests_per_record"] > 0
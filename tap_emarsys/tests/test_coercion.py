@@ -0,0 +1,95 @@
+"""Tests for casting API values to the types of each stream's schema."""
+
+import logging
+
+from singer_sdk import typing as th
+
+from tap_emarsys.coercion import compile_coercions, to_integer, to_number, to_string
+from tap_emarsys.tap import TapEmarsys
+
+SAMPLE_CONFIG = {"username": "user", "secret": "secret"}
+
+
+def test_compile_coercions():
+    """Numbers, integers and plain strings are cast, other types left to the SDK."""
+    schema = th.PropertiesList(
+        th.Property("id", th.NumberType),
+        th.Property("count", th.IntegerType),
+        th.Property("name", th.StringType),
+        th.Property("created", th.DateTimeType),
+        th.Property("tags", th.ArrayType(th.StringType)),
+        th.Property("is_rti", th.BooleanType),
+    ).to_dict()
+
+    assert compile_coercions(schema) == {
+        "id": to_number,
+        "count": to_integer,
+        "name": to_string,
+    }
+
+
+def test_coercions_are_null_safe():
+    assert [to_number(value) for value in ("12", "1.5", 3, None, "")] == [
+        12,
+        1.5,
+        3,
+        None,
+        None,
+    ]
+    assert [to_integer(value) for value in ("12", "1.5", None)] == [12, 1, None]
+    assert [to_string(value) for value in ("a", 5, None, "")] == ["a", "5", None, ""]
+
+
+def test_uncastable_values_are_nulled(caplog):
+    """A bad value is written as null, with one warning per property."""
+    stream = TapEmarsys(config=SAMPLE_CONFIG, parse_env_config=False).streams[
+        "email_response_summaries"
+    ]
+    rows = [
+        stream.post_process(
+            {"date": "2022-01-01", "sent": "10", "opened": opened, "planned": None},
+            {"email_campaign_id": "7"},
+        )
+        for opened in ("n/a", "?")
+    ]
+
+    assert rows[0] == {
+        "date": "2022-01-01",
+        "email_campaign_id": 7,
+        "sent": 10,
+        "opened": None,
+        "planned": None,
+    }
+    assert [
+        record.levelno for record in caplog.records if "'opened'" in record.getMessage()
+    ] == [logging.WARNING]
+
+
+def test_contact_fields_keep_nulls():
+    stream = TapEmarsys(config=SAMPLE_CONFIG, parse_env_config=False).streams[
+        "contact_fields"
+    ]
+    records = [
+        stream.post_process(record, None)
+        for record in stream.contact_records(
+            {"id": "11", "uid": "abc", "1": "Ann", "3": None}
+        )
+    ]
+
+    assert records == [
+        {"contact_id": 11, "uid": "abc", "field_id": 1, "field_value": "Ann"},
+        {"contact_id": 11, "uid": "abc", "field_id": 3, "field_value": None},
+    ]
+
+
+def test_contact_fields_skip_empty():
+    """Only null and empty values are dropped, and only when the setting is enabled."""
+    row = {"id": "11", "uid": "abc", "1": "Ann", "2": "", "3": None, "4": "0"}
+    for skip_empty, field_ids in ((False, [1, 2, 3, 4]), (True, [1, 4])):
+        tap = TapEmarsys(
+            config=dict(SAMPLE_CONFIG, contact_fields_skip_empty=skip_empty),
+            parse_env_config=False,
+        )
+        records = list(tap.streams["contact_fields"].contact_records(dict(row)))
+
+        assert [record["field_id"] for record in records] == field_ids
@@ -0,0 +1,262 @@
+"""Tests for the bulk contact export mode, against a local fake export server."""
+
+import contextlib
+import io
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from singer_sdk.exceptions import ConfigValidationError
+
+from tap_emarsys.client import EmarsysStream
+from tap_emarsys.tap import TapEmarsys
+from tap_emarsys.tests.fake_api import FakeEmarsysAPI
+
+FIELDS = [
+    {
+        "id": 1,
+        "name": "First Name",
+        "application_type": "shorttext",
+        "string_id": "first_name",
+    },
+    {"id": 3, "name": "Email", "application_type": "longtext", "string_id": "email"},
+]
+EXPORT_CSV = (
+    "user_id,uid,First Name,Email\r\n11,abc,Ann,ann@example.com\r\n12,def,Bob,\r\n"
+)
+
+
+class FakeExportHandler(BaseHTTPRequestHandler):
+    """Serves the field catalogue and a contact export that is ready on the 2nd poll."""
+
+    polls = 0
+    submitted = []
+    export_csv = EXPORT_CSV
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, body, content_type="application/json"):
+        payload = body if isinstance(body, str) else json.dumps(body)
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.end_headers()
+        self.wfile.write(payload.encode())
+
+    def do_POST(self):
+        length = int(self.headers["Content-Length"])
+        FakeExportHandler.submitted.append(json.loads(self.rfile.read(length)))
+        self._send({"replyCode": 0, "data": {"id": 7}})
+
+    def do_GET(self):
+        if self.path == "/api/v2/field/translate/en":
+            self._send({"replyCode": 0, "data": FIELDS})
+        elif self.path == "/api/v2/export/7":
+            FakeExportHandler.polls += 1
+            status = "done" if FakeExportHandler.polls > 1 else "in progress"
+            self._send({"replyCode": 0, "data": {"id": 7, "status": status}})
+        elif self.path == "/api/v2/export/7/data":
+            self._send(FakeExportHandler.export_csv, content_type="text/csv")
+        else:
+            self.send_error(404)
+
+
+@pytest.fixture
+def export_server(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeExportHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(
+        EmarsysStream, "url_base", f"http://127.0.0.1:{server.server_port}/api/v2"
+    )
+    FakeExportHandler.polls = 0
+    FakeExportHandler.submitted = []
+    FakeExportHandler.export_csv = EXPORT_CSV
+    yield server
+    server.shutdown()
+
+
+def test_contact_fields_export(export_server):
+    """An export is submitted, polled and its CSV exploded into contact fields."""
+    tap = TapEmarsys(
+        config={
+            "username": "user",
+            "secret": "secret",
+            "contact_fields_export": True,
+            "contact_export_segment_id": 42,
+            "contact_export_poll_interval": 0,
+        },
+        parse_env_config=False,
+    )
+    records = list(tap.streams["contact_fields"].get_records(None))
+
+    assert FakeExportHandler.submitted == [
+        {
+            "filter": 42,
+            "contact_fields": [1, 3],
+            "distribution_method": "local",
+            "add_field_names_header": 1,
+            "language": "en",
+            "delimiter": ",",
+        }
+    ]
+    assert FakeExportHandler.polls == 2
+    assert records == [
+        {"contact_id": 11, "uid": "abc", "field_id": 1, "field_value": "Ann"},
+        {
+            "contact_id": 11,
+            "uid": "abc",
+            "field_id": 3,
+            "field_value": "ann@example.com",
+        },
+        {"contact_id": 12, "uid": "def", "field_id": 1, "field_value": "Bob"},
+        {"contact_id": 12, "uid": "def", "field_id": 3, "field_value": ""},
+    ]
+
+
+def test_contact_fields_export_values(export_server):
+    """Quoted line breaks and non-ASCII characters survive the CSV download."""
+    FakeExportHandler.export_csv = (
+        "user_id,uid,First Name,Email\r\n"
+        '11,abc,"Ann\nLine2",a\u2028b@example.com\r\n'
+        "12,déf,Zoë,\r\n"
+    )
+    tap = TapEmarsys(
+        config={
+            "username": "user",
+            "secret": "secret",
+            "contact_fields_export": True,
+            "contact_export_segment_id": 42,
+            "contact_export_poll_interval": 0,
+        },
+        parse_env_config=False,
+    )
+    records = list(tap.streams["contact_fields"].get_records(None))
+
+    assert [record["field_value"] for record in records] == [
+        "Ann\nLine2",
+        "a\u2028b@example.com",
+        "Zoë",
+        "",
+    ]
+    assert records[2]["uid"] == "déf"
+
+
+def test_contacts_wide_export(export_server):
+    """The wide stream turns each exported contact into a single record."""
+    tap = TapEmarsys(
+        config={
+            "username": "user",
+            "secret": "secret",
+            "contacts_wide": True,
+            "contact_fields_export": True,
+            "contact_export_segment_id": 42,
+            "contact_export_poll_interval": 0,
+        },
+        parse_env_config=False,
+    )
+    stream = tap.streams["contacts_wide"]
+    records = list(stream.get_records(None))
+
+    assert list(stream.schema["properties"]) == [
+        "contact_id",
+        "uid",
+        "first_name",
+        "email",
+    ]
+    assert records == [
+        {
+            "contact_id": 11,
+            "uid": "abc",
+            "first_name": "Ann",
+            "email": "ann@example.com",
+        },
+        {"contact_id": 12, "uid": "def", "first_name": "Bob", "email": ""},
+    ]
+
+
+def test_contact_fields_projection(export_server):
+    """Only the included fields, less the excluded ones, are requested."""
+    tap = TapEmarsys(
+        config={
+            "username": "user",
+            "secret": "secret",
+            "contacts_wide": True,
+            "contact_fields_export": True,
+            "contact_export_segment_id": 42,
+            "contact_export_poll_interval": 0,
+            "contact_fields_include": ["first_name", "3"],
+            "contact_fields_exclude": ["first_name"],
+        },
+        parse_env_config=False,
+    )
+    list(tap.streams["contact_fields"].get_records(None))
+
+    assert FakeExportHandler.submitted[0]["contact_fields"] == [3]
+    assert list(tap.streams["contacts_wide"].schema["properties"]) == [
+        "contact_id",
+        "uid",
+        "email",
+    ]
+
+
+def test_contacts_wide_catalog_selection(export_server):
+    """Properties deselected in the catalog are not requested."""
+    config = {
+        "username": "user",
+        "secret": "secret",
+        "contacts_wide": True,
+        "contact_fields_export": True,
+        "contact_export_segment_id": 42,
+        "contact_export_poll_interval": 0,
+    }
+    catalog = TapEmarsys(config=config, parse_env_config=False).catalog_dict
+    for entry in catalog["streams"]:
+        for metadata in entry["metadata"]:
+            if metadata["breadcrumb"] == ["properties", "email"]:
+                metadata["metadata"]["selected"] = False
+    tap = TapEmarsys(config=config, catalog=catalog, parse_env_config=False)
+    list(tap.streams["contacts_wide"].get_records(None))
+
+    assert FakeExportHandler.submitted[-1]["contact_fields"] == [1]
+
+
+def test_export_requires_segment():
+    with pytest.raises(ConfigValidationError, match="contact_export_segment_id"):
+        TapEmarsys(
+            config={
+                "username": "user",
+                "secret": "secret",
+                "contact_fields_export": True,
+            },
+            parse_env_config=False,
+        )
+
+
+def test_export_skips_contact_listing(monkeypatch):
+    """Contacts are not listed for an export unless contact_ids is selected."""
+    config = {
+        "username": "user",
+        "secret": "secret",
+        "contact_fields_export": True,
+        "contact_export_segment_id": 1,
+        "contact_export_poll_interval": 0,
+    }
+    with FakeEmarsysAPI(contacts=50, fields=2) as api:
+        monkeypatch.setattr(EmarsysStream, "url_base", api.url_base)
+        catalog = TapEmarsys(config=config, parse_env_config=False).catalog_dict
+        for entry in catalog["streams"]:
+            for metadata in entry["metadata"]:
+                if not metadata["breadcrumb"]:
+                    metadata["metadata"]["selected"] = (
+                        entry["tap_stream_id"] == "contact_fields"
+                    )
+        tap = TapEmarsys(config=config, catalog=catalog, parse_env_config=False)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            tap.sync_all()
+
+    messages = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert sum(message["type"] == "RECORD" for message in messages) == 50 * 2
+    assert api.requests["/contact/query/"] == 0
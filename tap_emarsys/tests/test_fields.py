@@ -0,0 +1,121 @@
+"""Tests for the field catalogue and its disk cache."""
+
+import contextlib
+import io
+import json
+import time
+
+import pytest
+
+from tap_emarsys.client import EmarsysStream
+from tap_emarsys.fields import FieldCatalogue
+from tap_emarsys.tap import TapEmarsys
+from tap_emarsys.tests.fake_api import FakeEmarsysAPI
+
+FIELDS = [
+    {
+        "id": 1,
+        "name": "First Name",
+        "application_type": "shorttext",
+        "string_id": "first_name",
+    },
+    {"id": 3, "name": "Email", "application_type": "longtext", "string_id": "email"},
+]
+
+
+class CountingFetch:
+    """Stands in for /field/translate, counting its calls."""
+
+    def __init__(self, fields=FIELDS) -> None:
+        self.fields = fields
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return iter(self.fields)
+
+
+def test_fetched_once():
+    catalogue = FieldCatalogue(language_id="en")
+    fetch = CountingFetch()
+    catalogue.load(fetch)
+    catalogue.load(fetch)
+
+    assert fetch.calls == 1
+    assert catalogue.resolve("email")["id"] == 3
+    assert catalogue.resolve(1)["string_id"] == "first_name"
+
+
+def test_cache_reused_within_ttl(tmp_path):
+    cache_path = str(tmp_path / "fields.json")
+    first = CountingFetch()
+    FieldCatalogue(language_id="en", cache_path=cache_path, ttl=60).load(first)
+    second = CountingFetch()
+    catalogue = FieldCatalogue(language_id="en", cache_path=cache_path, ttl=60)
+    catalogue.load(second)
+
+    assert (first.calls, second.calls) == (1, 0)
+    assert catalogue.fields == FIELDS
+
+
+def test_expired_cache_is_refetched(tmp_path, monkeypatch):
+    cache_path = str(tmp_path / "fields.json")
+    FieldCatalogue(language_id="en", cache_path=cache_path, ttl=60).load(
+        CountingFetch()
+    )
+    fetched_at = time.time()
+    monkeypatch.setattr(time, "time", lambda: fetched_at + 61)
+    fetch = CountingFetch(FIELDS[:1])
+    catalogue = FieldCatalogue(language_id="en", cache_path=cache_path, ttl=60)
+    catalogue.load(fetch)
+
+    assert fetch.calls == 1
+    assert catalogue.fields == FIELDS[:1]
+    assert json.loads((tmp_path / "fields.json").read_text())["fields"] == FIELDS[:1]
+
+
+def test_cache_of_another_language_is_refetched(tmp_path):
+    cache_path = str(tmp_path / "fields.json")
+    FieldCatalogue(language_id="de", cache_path=cache_path, ttl=60).load(
+        CountingFetch()
+    )
+    fetch = CountingFetch()
+    FieldCatalogue(language_id="en", cache_path=cache_path, ttl=60).load(fetch)
+
+    assert fetch.calls == 1
+    assert json.loads((tmp_path / "fields.json").read_text())["language_id"] == "en"
+
+
+@pytest.mark.parametrize(
+    "content", ["{not json", "[]", '{"language_id": "en"}', "null"]
+)
+def test_corrupt_cache_is_refetched(tmp_path, content):
+    (tmp_path / "fields.json").write_text(content)
+    fetch = CountingFetch()
+    catalogue = FieldCatalogue(
+        language_id="en", cache_path=str(tmp_path / "fields.json"), ttl=60
+    )
+    catalogue.load(fetch)
+
+    assert fetch.calls == 1
+    assert catalogue.fields == FIELDS
+
+
+def test_one_field_translate_call_per_run(monkeypatch):
+    """Every stream that needs the catalogue shares one request for it."""
+    with FakeEmarsysAPI(contacts=20, fields=3, modified_days=5) as api:
+        monkeypatch.setattr(EmarsysStream, "url_base", api.url_base)
+        tap = TapEmarsys(
+            config={
+                "username": "user",
+                "secret": "secret",
+                "contacts_wide": True,
+                "contact_modified_field": "last_modified",
+                "contact_fields_include": ["field_1", "field_2"],
+            },
+            parse_env_config=False,
+        )
+        with contextlib.redirect_stdout(io.StringIO()):
+            tap.sync_all()
+
+    assert api.requests[r"/field/translate/(\w+)"] == 1
@@ -0,0 +1,57 @@
+"""Tests and micro-benchmark for the compiled record accessors."""
+
+import timeit
+
+import pytest
+from singer_sdk.helpers.jsonpath import extract_jsonpath
+
+from tap_emarsys.client import compile_jsonpath
+from tap_emarsys.tap import STREAM_TYPES
+
+CONTACTS_PAGE = {
+    "data": {"result": [{"id": str(contact_id)} for contact_id in range(10000)]}
+}
+CONTACT_LIST_PAGE = {
+    "data": [
+        {"fields": {"id": contact_id, "uid": f"u{contact_id}"}, "meta": {}}
+        for contact_id in range(2000)
+    ]
+}
+BODIES = [
+    CONTACTS_PAGE,
+    CONTACT_LIST_PAGE,
+    {"data": {"sent": "1", "opened": "0"}},
+    {"data": [{"fields": {"fields": {"id": 1}}, "other": [{"fields": 2}]}]},
+    {"data": None},
+    {"data": "scalar"},
+    {"next_page": 3},
+    {},
+]
+
+
+@pytest.mark.parametrize(
+    "expression",
+    sorted(
+        {stream_class.records_jsonpath for stream_class in STREAM_TYPES}
+        | {"$.next_page", "$.data.result[*].id", "$.data[0]"}
+    ),
+)
+def test_compiled_jsonpath_matches_jsonpath(expression):
+    """Compiled accessors return exactly what JSONPath returns."""
+    for body in BODIES:
+        assert list(compile_jsonpath(expression)(body)) == list(
+            extract_jsonpath(expression, input=body)
+        )
+
+
+@pytest.mark.parametrize(
+    "expression, body",
+    [("$.data.result[*]", CONTACTS_PAGE), ("$.data[*]..fields", CONTACT_LIST_PAGE)],
+)
+def test_compiled_jsonpath_benchmark(expression, body):
+    """Compiled accessors are faster than a generic JSONPath evaluation."""
+    compiled = timeit.timeit(lambda: list(compile_jsonpath(expression)(body)), number=5)
+    generic = timeit.timeit(
+        lambda: list(extract_jsonpath(expression, input=body)), number=5
+    )
+    assert compiled < generic
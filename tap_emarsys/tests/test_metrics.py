@@ -0,0 +1,79 @@
+"""Tests for the request metrics, against the local fake Emarsys API."""
+
+import contextlib
+import io
+import time
+
+import requests
+
+from tap_emarsys.client import EmarsysStream
+from tap_emarsys.tap import TapEmarsys
+from tap_emarsys.tests.fake_api import FakeEmarsysAPI
+
+
+def test_request_metrics(monkeypatch, caplog):
+    """Requests, retries, status codes and records are counted per endpoint."""
+    monkeypatch.setattr(time, "sleep", lambda seconds: None)
+    with FakeEmarsysAPI(contacts=250, fields=4, failures={503: 3}) as api:
+        monkeypatch.setattr(EmarsysStream, "url_base", api.url_base)
+        tap = TapEmarsys(
+            config={
+                "username": "user",
+                "secret": "secret",
+                "contact_page_size": 100,
+                "contact_batch_size": 50,
+                "metrics_log_interval": 0,
+            },
+            parse_env_config=False,
+        )
+        with contextlib.redirect_stdout(io.StringIO()):
+            tap.streams["contact_ids"].sync()
+        tap.request_metrics.log_summary()
+
+    metrics = tap.request_metrics.snapshot()
+    contact_ids = metrics[("contact_ids", "/contact/query/")]
+    contact_fields = metrics[("contact_fields", "/contact/getdata")]
+    assert contact_ids["records"] == 250
+    assert contact_fields["records"] == 250 * 4
+    assert (
+        sum(endpoint["requests"] for endpoint in metrics.values()) == api.total_requests
+    )
+    assert (
+        sum(endpoint["retries"] for endpoint in metrics.values())
+        == api.total_requests // 3
+    )
+    assert contact_fields["status_codes"]["200"] == 5
+    assert contact_fields["bytes_received"] > 0
+    assert contact_fields["latency_p50"] <= contact_fields["latency_max"]
+    assert '"metric": "api_usage_summary"' in caplog.text
+
+
+def test_connection_errors_are_counted(monkeypatch, caplog):
+    """A request that gets no response is counted under the name of its error."""
+    monkeypatch.setattr(time, "sleep", lambda seconds: None)
+    send = requests.Session.send
+    failed = []
+
+    def send_or_fail(session, request, **kwargs):
+        if request.url.endswith("/contact/getdata") and not failed:
+            failed.append(request.url)
+            raise requests.exceptions.ConnectionError("Connection reset")
+        return send(session, request, **kwargs)
+
+    monkeypatch.setattr(requests.Session, "send", send_or_fail)
+    with FakeEmarsysAPI(contacts=20, fields=2) as api:
+        monkeypatch.setattr(EmarsysStream, "url_base", api.url_base)
+        tap = TapEmarsys(
+            config={"username": "user", "secret": "secret"}, parse_env_config=False
+        )
+        with contextlib.redirect_stdout(io.StringIO()):
+            tap.streams["contact_ids"].sync()
+        tap.request_metrics.log_summary()
+
+    contact_fields = tap.request_metrics.snapshot()[
+        ("contact_fields", "/contact/getdata")
+    ]
+    assert contact_fields["status_codes"] == {"200": 1, "ConnectionError": 1}
+    assert contact_fields["retries"] == 1
+    assert contact_fields["records"] == 20 * 2
+    assert "after attempt 1: Connection reset" in caplog.text
@@ -0,0 +1,62 @@
+"""Tests for the buffered writer of Singer messages."""
+
+import contextlib
+import decimal
+import io
+import json
+import time
+
+from singer import SchemaMessage, StateMessage
+
+from tap_emarsys.output import MessageWriter
+
+
+def test_messages_are_buffered_until_state():
+    """Records wait in the buffer until a STATE message, which is written after them."""
+    writer = MessageWriter(buffer_size=1048576, flush_interval=3600)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        writer.write_message(
+            SchemaMessage(stream="s", schema={}, key_properties=["id"])
+        )
+        writer.write_record("s", {"id": 1, "value": decimal.Decimal("1.5")})
+        assert output.getvalue() == ""
+        writer.write_message(StateMessage(value={"bookmarks": {}}))
+
+    messages = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [message["type"] for message in messages] == ["SCHEMA", "RECORD", "STATE"]
+    assert messages[1]["record"] == {"id": 1, "value": 1.5}
+    assert messages[1]["time_extracted"].endswith("Z")
+
+
+def test_full_buffer_is_written():
+    writer = MessageWriter(buffer_size=100, flush_interval=3600)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        # Each record is over half the buffer, so they are written two at a time
+        for record_id in range(9):
+            writer.write_record("s", {"id": record_id})
+        written = output.getvalue()
+        writer.flush()
+
+    assert 0 < len(written) < len(output.getvalue())
+    assert len(output.getvalue().splitlines()) == 9
+
+
+def test_quiet_buffer_is_written_after_interval():
+    """A buffered record is written within the interval, even if nothing follows."""
+    writer = MessageWriter(buffer_size=1048576, flush_interval=0.05)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        writer.write_record("s", {"id": 1})
+        assert output.getvalue() == ""
+        deadline = time.monotonic() + 5
+        while not output.getvalue() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        writer.close()
+
+    assert [json.loads(line)["record"] for line in output.getvalue().splitlines()] == [
+        {"id": 1}
+    ]
+    writer._flusher.join(timeout=1)
+    assert not writer._flusher.is_alive()
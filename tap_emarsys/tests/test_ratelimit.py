@@ -0,0 +1,124 @@
+"""Tests for the client-side pacing of requests."""
+
+import email.utils
+
+import pytest
+import requests
+
+from tap_emarsys import ratelimit
+from tap_emarsys.ratelimit import RateLimiter
+
+EPOCH = 1_700_000_000.0
+
+
+class FakeClock:
+    """Stands in for the `time` module, advancing only when slept on."""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return EPOCH + self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit, "time", clock)
+    return clock
+
+
+def response(status_code: int = 200, **headers: str) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(
+        {name.replace("_", "-"): value for name, value in headers.items()}
+    )
+    return response
+
+
+def test_unpaced_without_rate(clock):
+    limiter = RateLimiter()
+    for _ in range(10):
+        limiter.acquire()
+
+    assert clock.sleeps == []
+
+
+def test_token_bucket_pacing(clock):
+    """A burst of up to `rate` requests goes straight out, then `rate` a second."""
+    limiter = RateLimiter(rate=2)
+    for _ in range(6):
+        limiter.acquire()
+
+    assert clock.sleeps == [0.5, 0.5, 0.5, 0.5]
+    assert clock.now == 2.0
+
+
+@pytest.mark.parametrize("reset", ["10", str(EPOCH + 10)])
+def test_adapts_to_remaining_quota(clock, reset):
+    """The remaining quota is spread over the window, with a relative or epoch reset."""
+    limiter = RateLimiter()
+    limiter.update(response(X_Ratelimit_Remaining="5", X_Ratelimit_Reset=reset))
+    for _ in range(3):
+        limiter.acquire()
+
+    assert clock.sleeps == pytest.approx([2.0, 2.0])
+
+
+def test_configured_rate_is_a_ceiling(clock):
+    limiter = RateLimiter(rate=1)
+    limiter.update(response(X_Ratelimit_Remaining="100", X_Ratelimit_Reset="10"))
+    for _ in range(3):
+        limiter.acquire()
+
+    assert clock.sleeps == [1.0, 1.0]
+
+
+def test_exhausted_quota_blocks_until_reset(clock):
+    limiter = RateLimiter()
+    limiter.update(response(X_Ratelimit_Remaining="0", X_Ratelimit_Reset="30"))
+    limiter.acquire()
+
+    assert clock.now == 30.0
+
+
+@pytest.mark.parametrize(
+    "retry_after",
+    ["20", email.utils.formatdate(EPOCH + 20, usegmt=True)],
+)
+def test_too_many_requests_blocks_for_retry_after(clock, retry_after):
+    """A 429 blocks for its `Retry-After`, given in seconds or as an HTTP date."""
+    limiter = RateLimiter()
+    limiter.update(response(429, Retry_After=retry_after))
+    limiter.acquire()
+
+    assert clock.now == pytest.approx(20.0)
+
+
+def test_unparsable_retry_after_falls_back_to_quota(clock):
+    limiter = RateLimiter()
+    limiter.update(
+        response(
+            429, Retry_After="soon", X_Ratelimit_Remaining="3", X_Ratelimit_Reset="15"
+        )
+    )
+    limiter.acquire()
+
+    assert clock.now == 15.0
+
+
+def test_unparsable_retry_after_alone_is_ignored(clock):
+    limiter = RateLimiter()
+    limiter.update(response(429, Retry_After="soon"))
+    limiter.acquire()
+
+    assert clock.sleeps == []
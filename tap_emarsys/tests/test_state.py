@@ -0,0 +1,332 @@
+"""Tests for the state kept by contact-level streams."""
+
+import contextlib
+import datetime
+import io
+import json
+
+from tap_emarsys.client import EmarsysStream
+from tap_emarsys.tap import TapEmarsys
+from tap_emarsys.tests.fake_api import FakeEmarsysAPI
+
+SAMPLE_CONFIG = {"username": "user", "secret": "secret"}
+
+
+def test_contact_partitions_share_stream_state():
+    """Per-contact partitions from earlier runs are dropped and not recreated."""
+    state = {
+        "bookmarks": {
+            "contact_fields": {
+                "partitions": [
+                    {"context": {"contact_id": contact_id}}
+                    for contact_id in range(1000)
+                ]
+            }
+        }
+    }
+    tap = TapEmarsys(config=SAMPLE_CONFIG, state=state, parse_env_config=False)
+    stream = tap.streams["contact_fields"]
+
+    for contact_id in range(1000):
+        assert (
+            stream.get_context_state({"contact_id": contact_id}) is stream.stream_state
+        )
+    assert stream.get_context_state({"contact_ids": [1, 2]}) is stream.stream_state
+    assert tap.state["bookmarks"]["contact_fields"] == {}
+
+
+def test_contact_listing_resumes_from_checkpoint(monkeypatch):
+    """The listing starts at the saved offset and checkpoints every few pages."""
+    state = {"bookmarks": {"contact_ids": {"offset": 20}}}
+    tap = TapEmarsys(
+        config=dict(SAMPLE_CONFIG, contact_page_size=10, contact_checkpoint_pages=2),
+        state=state,
+        parse_env_config=False,
+    )
+    stream = tap.streams["contact_ids"]
+    checkpoints = []
+
+    def request_pages(context, offset):
+        for page_offset in range(offset, 50, 10):
+            yield page_offset, [{"id": str(page_offset + i)} for i in range(10)]
+
+    monkeypatch.setattr(stream, "_request_pages", request_pages)
+    monkeypatch.setattr(
+        stream,
+        "_checkpoint",
+        lambda offset, modified_on=None: checkpoints.append(offset),
+    )
+    rows = list(stream.request_records(None))
+
+    assert [row["id"] for row in rows] == [str(i) for i in range(20, 50)]
+    assert checkpoints == [40]
+    assert "offset" not in tap.state["bookmarks"]["contact_ids"]
+
+
+def test_unchanged_campaigns_are_skipped(monkeypatch):
+    """A sent campaign is requested again only once its fingerprint changes."""
+    state = {
+        "bookmarks": {
+            "email_campaign_details": {
+                "partitions": [
+                    {"context": {"email_campaign_id": 1}, "fingerprint": "abc"},
+                    # Keyed by the whole parent context, as in earlier versions
+                    {"context": {"email_campaign_id": 2, "email_status": "3"}},
+                ]
+            }
+        }
+    }
+    tap = TapEmarsys(
+        config=dict(SAMPLE_CONFIG, email_campaign_skip_unchanged=True),
+        state=state,
+        parse_env_config=False,
+    )
+    stream = tap.streams["email_campaign_details"]
+    monkeypatch.setattr(
+        EmarsysStream, "request_records", lambda self, context: iter([{"id": 1}])
+    )
+
+    def context(status="3", fingerprint="abc"):
+        return {
+            "email_campaign_id": 1,
+            "email_created_at": "2024-01-01 00:00:00",
+            "email_deleted_at": None,
+            "email_status": status,
+            "email_fingerprint": fingerprint,
+        }
+
+    assert tap.state["bookmarks"]["email_campaign_details"]["partitions"] == [
+        {"context": {"email_campaign_id": 1}, "fingerprint": "abc"}
+    ]
+    assert list(stream.get_records(context())) == []
+    assert list(stream.get_records(context(status="2"))) == [{"id": 1}]
+    assert list(stream.get_records(context(fingerprint="def"))) == [{"id": 1}]
+    assert stream.get_context_state(context())["fingerprint"] == "def"
+
+
+def test_incremental_contact_listing(monkeypatch):
+    """Only contacts modified since the bookmark are listed, a day at a time."""
+    today = datetime.date.today()
+    state = {
+        "bookmarks": {
+            "contact_ids": {
+                "modified_since": (today - datetime.timedelta(days=2)).isoformat()
+            }
+        }
+    }
+    with FakeEmarsysAPI(contacts=100, fields=2, modified_days=10) as api:
+        monkeypatch.setattr(EmarsysStream, "url_base", api.url_base)
+        tap = TapEmarsys(
+            config=dict(SAMPLE_CONFIG, contact_modified_field="last_modified"),
+            state=state,
+            parse_env_config=False,
+        )
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            tap.streams["contact_ids"].sync()
+
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    contact_ids = [
+        record["record"]["id"]
+        for record in records
+        if record["type"] == "RECORD" and record["stream"] == "contact_ids"
+    ]
+    field_contact_ids = {
+        record["record"]["contact_id"]
+        for record in records
+        if record["type"] == "RECORD" and record["stream"] == "contact_fields"
+    }
+    # Contact i was last modified i % 10 days ago
+    expected = [i for days in (2, 1, 0) for i in range(1, 101) if i % 10 == days]
+    assert contact_ids == expected
+    assert field_contact_ids == set(expected)
+    assert api.requests["/contact/query/"] == 3
+    assert tap.state["bookmarks"]["contact_ids"] == {
+        "modified_since": today.isoformat()
+    }
+
+
+def test_first_incremental_run_lists_all_contacts(monkeypatch):
+    """Without a bookmark every contact is listed, and only then is the bookmark set."""
+    today = datetime.date.today()
+    with FakeEmarsysAPI(contacts=100, fields=2, modified_days=10) as api:
+        monkeypatch.setattr(EmarsysStream, "url_base", api.url_base)
+        tap = TapEmarsys(
+            config=dict(
+                SAMPLE_CONFIG,
+                contact_modified_field="last_modified",
+                start_date="2010-01-01T00:00:00Z",
+                contact_batch_size=10,
+                max_workers=4,
+            ),
+            parse_env_config=False,
+        )
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            tap.streams["contact_ids"].sync()
+
+    messages = [json.loads(line) for line in output.getvalue().splitlines()]
+    # One page per worker is requested speculatively, rather than one per day since 2010
+    assert api.requests["/contact/query/"] == 4
+    last_contact_fields = max(
+        index
+        for index, message in enumerate(messages)
+        if message["type"] == "RECORD" and message["stream"] == "contact_fields"
+    )
+    first_bookmark = min(
+        index
+        for index, message in enumerate(messages)
+        if message["type"] == "STATE"
+        and "modified_since" in message["value"]["bookmarks"]["contact_ids"]
+    )
+    assert last_contact_fields < first_bookmark
+    assert tap.state["bookmarks"]["contact_ids"] == {
+        "modified_since": today.isoformat()
+    }
+
+
+def test_response_summaries_resume_from_bookmark(monkeypatch):
+    """Only the lookback days before a campaign's bookmark are requested again."""
+    today = datetime.date.today()
+    bookmark = today - datetime.timedelta(days=3)
+    state = {
+        "bookmarks": {
+            "email_response_summaries": {
+                "partitions": [
+                    {
+                        "context": {"email_campaign_id": 1},
+                        "replication_key": "date",
+                        "replication_key_value": bookmark.isoformat(),
+                    }
+                ]
+            }
+        }
+    }
+    with FakeEmarsysAPI(contacts=10, fields=1, campaigns=1, campaign_days=90) as api:
+        monkeypatch.setattr(EmarsysStream, "url_base", api.url_base)
+        tap = TapEmarsys(
+            config=dict(
+                SAMPLE_CONFIG,
+                email_response_summary_window_days=1,
+                email_response_summary_lookback_days=7,
+            ),
+            state=state,
+            parse_env_config=False,
+        )
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            tap.streams["email_campaigns"].sync()
+
+    dates = [
+        message["record"]["date"][:10]
+        for message in map(json.loads, output.getvalue().splitlines())
+        if message["type"] == "RECORD"
+        and message["stream"] == "email_response_summaries"
+    ]
+    expected = [
+        (bookmark - datetime.timedelta(days=days)).isoformat()
+        for days in range(7, -4, -1)
+    ]
+    assert dates == expected
+    assert api.requests[r"/email/(\d+)/responsesummary/"] == len(expected)
+
+
+def test_response_summaries_start_at_start_date(monkeypatch):
+    """Without a bookmark, summaries start at `start_date`, with no lookback."""
+    start_date = datetime.date.today() - datetime.timedelta(days=3)
+    with FakeEmarsysAPI(contacts=10, fields=1, campaigns=1, campaign_days=90) as api:
+        monkeypatch.setattr(EmarsysStream, "url_base", api.url_base)
+        tap = TapEmarsys(
+            config=dict(
+                SAMPLE_CONFIG,
+                start_date=start_date.isoformat() + "T00:00:00Z",
+                email_response_summary_window_days=1,
+                email_response_summary_lookback_days=7,
+            ),
+            parse_env_config=False,
+        )
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            tap.streams["email_campaigns"].sync()
+
+    dates = [
+        message["record"]["date"][:10]
+        for message in map(json.loads, output.getvalue().splitlines())
+        if message["type"] == "RECORD"
+        and message["stream"] == "email_response_summaries"
+    ]
+    assert dates == [
+        (start_date + datetime.timedelta(days=days)).isoformat() for days in range(4)
+    ]
+    assert api.requests[r"/email/(\d+)/responsesummary/"] == 4
+
+
+def test_campaign_deleted_before_bookmark_is_not_requested(monkeypatch):
+    state = {
+        "bookmarks": {
+            "email_response_summaries": {
+                "partitions": [
+                    {
+                        "context": {"email_campaign_id": 1},
+                        "replication_key": "date",
+                        "replication_key_value": "2024-03-10",
+                    }
+                ]
+            }
+        }
+    }
+    with FakeEmarsysAPI(campaigns=1) as api:
+        monkeypatch.setattr(EmarsysStream, "url_base", api.url_base)
+        tap = TapEmarsys(config=SAMPLE_CONFIG, state=state, parse_env_config=False)
+        context = {
+            "email_campaign_id": 1,
+            "email_created_at": "2024-01-01 00:00:00",
+            "email_deleted_at": "2024-03-01 00:00:00",
+            "email_status": "3",
+            "email_fingerprint": "abc",
+        }
+        rows = list(tap.streams["email_response_summaries"].request_records(context))
+
+    assert rows == []
+    assert api.total_requests == 0
+
+
+def test_concurrent_contact_listing_resumes_from_checkpoint(monkeypatch):
+    """Pages requested ahead by several workers are read in order.
+
+    Listing resumes from the saved offset and stops at the first short page.
+    """
+    state = {"bookmarks": {"contact_ids": {"offset": 20}}}
+    with FakeEmarsysAPI(contacts=95, fields=1, latency=0.002) as api:
+        monkeypatch.setattr(EmarsysStream, "url_base", api.url_base)
+        tap = TapEmarsys(
+            config=dict(
+                SAMPLE_CONFIG,
+                contact_page_size=10,
+                contact_checkpoint_pages=2,
+                max_workers=3,
+            ),
+            state=state,
+            parse_env_config=False,
+        )
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            tap.streams["contact_ids"].sync()
+
+    messages = [json.loads(line) for line in output.getvalue().splitlines()]
+    contact_ids = [
+        message["record"]["id"]
+        for message in messages
+        if message["type"] == "RECORD" and message["stream"] == "contact_ids"
+    ]
+    checkpoints = [
+        message["value"]["bookmarks"]["contact_ids"].get("offset")
+        for message in messages
+        if message["type"] == "STATE"
+    ]
+    assert contact_ids == list(range(21, 96))
+    # The saved offset is repeated by the states of child streams until it moves
+    assert list(dict.fromkeys(checkpoints)) == [20, 40, 60, 80, 95, None]
+    # Eight pages up to the short one, and at most `max_workers - 1` requested past it
+    assert 8 <= api.requests["/contact/query/"] <= 10
+    assert "offset" not in tap.state["bookmarks"]["contact_ids"]
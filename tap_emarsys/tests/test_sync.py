@@ -0,0 +1,202 @@
+"""Tests for syncing every stream, against the local fake Emarsys API."""
+
+import contextlib
+import io
+import json
+import logging
+import time
+from collections import Counter
+
+import pytest
+import requests
+
+from tap_emarsys.client import EmarsysStream
+from tap_emarsys.streams import ContactIdsStream, ContactListsStream
+from tap_emarsys.tap import TapEmarsys
+from tap_emarsys.tests.fake_api import FakeEmarsysAPI
+
+
+def sync_all(config: dict) -> list:
+    """Sync every stream and return the messages written."""
+    tap = TapEmarsys(
+        config=dict({"username": "user", "secret": "secret"}, **config),
+        parse_env_config=False,
+    )
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        tap.sync_all()
+    return [json.loads(line) for line in output.getvalue().splitlines()]
+
+
+def test_parallel_streams(monkeypatch):
+    """Stream trees synced concurrently write the same, well-formed, messages."""
+    with FakeEmarsysAPI(
+        contacts=200, fields=5, campaigns=5, campaign_days=10, latency=0.002
+    ) as api:
+        monkeypatch.setattr(EmarsysStream, "url_base", api.url_base)
+        sequential = sync_all({})
+        parallel = sync_all({"max_parallel_streams": 4, "max_workers": 2})
+
+    def records(messages: list) -> Counter:
+        return Counter(
+            message["stream"] for message in messages if message["type"] == "RECORD"
+        )
+
+    assert records(parallel) == records(sequential)
+    assert records(parallel)["contact_fields"] == 200 * 5
+    streams_with_schema = set()
+    for message in parallel:
+        if message["type"] == "SCHEMA":
+            streams_with_schema.add(message["stream"])
+        elif message["type"] == "RECORD":
+            assert message["stream"] in streams_with_schema
+    states = [message["value"] for message in parallel if message["type"] == "STATE"]
+    assert (
+        states[-1]
+        == [message["value"] for message in sequential if message["type"] == "STATE"][
+            -1
+        ]
+    )
+
+
+def test_failed_stream_stops_parallel_streams(monkeypatch):
+    """Once one stream tree fails, the others stop at their next request."""
+
+    def fail(self, context):
+        raise RuntimeError("Broken stream")
+
+    with FakeEmarsysAPI(
+        contacts=200, fields=5, campaigns=5, campaign_days=10, latency=0.01
+    ) as api:
+        monkeypatch.setattr(EmarsysStream, "url_base", api.url_base)
+        monkeypatch.setattr(ContactListsStream, "get_records", fail)
+        with pytest.raises(RuntimeError, match="Broken stream"):
+            sync_all(
+                {
+                    "max_parallel_streams": 2,
+                    "contact_page_size": 10,
+                    "contact_batch_size": 10,
+                }
+            )
+
+    # A full sync makes well over a hundred requests
+    assert api.total_requests < 10
+
+
+def test_response_summary_windows(monkeypatch):
+    """Multi-day windows give the same rows as daily requests, in fewer requests."""
+    summaries = r"/email/(\d+)/responsesummary/"
+
+    def sync_summaries(window_days: int):
+        with FakeEmarsysAPI(
+            contacts=10, fields=1, campaigns=3, campaign_days=90
+        ) as api:
+            monkeypatch.setattr(EmarsysStream, "url_base", api.url_base)
+            messages = sync_all({"email_response_summary_window_days": window_days})
+        rows = sorted(
+            (
+                message["record"]["email_campaign_id"],
+                message["record"]["date"],
+                json.dumps(message["record"]),
+            )
+            for message in messages
+            if message["type"] == "RECORD"
+            and message["stream"] == "email_response_summaries"
+        )
+        return rows, api.requests[summaries]
+
+    daily_rows, daily_requests = sync_summaries(1)
+    windowed_rows, windowed_requests = sync_summaries(30)
+
+    assert windowed_rows == daily_rows
+    # Three campaigns of about 90 days, each with a week of activity
+    assert len(daily_rows) > 3 * 89
+    assert daily_requests == len(daily_rows)
+    # Only the window with the launch week is requested again day by day
+    assert windowed_requests < daily_requests / 2
+
+
+def test_failed_summary_window_is_retried_in_place(monkeypatch, caplog):
+    """Only the window whose request failed is requested again."""
+    monkeypatch.setattr(time, "sleep", lambda seconds: None)
+    send = requests.Session.send
+    windows = []
+    fail_request = None
+
+    def send_or_fail(session, request, **kwargs):
+        if "/responsesummary/" in request.url:
+            windows.append(request.url.split("?")[1])
+            if len(windows) == fail_request:
+                raise requests.exceptions.ConnectionError("Connection reset")
+        return send(session, request, **kwargs)
+
+    def sync_summaries() -> list:
+        windows.clear()
+        with FakeEmarsysAPI(
+            contacts=10, fields=1, campaigns=1, campaign_days=90
+        ) as api:
+            monkeypatch.setattr(EmarsysStream, "url_base", api.url_base)
+            messages = sync_all({"email_response_summary_window_days": 30})
+        return [
+            message["record"]
+            for message in messages
+            if message["type"] == "RECORD"
+            and message["stream"] == "email_response_summaries"
+        ]
+
+    monkeypatch.setattr(requests.Session, "send", send_or_fail)
+    expected_records = sync_summaries()
+    expected_windows = list(windows)
+    fail_request = 2
+    records = sync_summaries()
+
+    assert records == expected_records
+    assert windows == expected_windows[:2] + expected_windows[1:]
+    assert "after attempt 1: Connection reset" in caplog.text
+
+
+def test_contact_fields_batches(monkeypatch, caplog):
+    """Listed contacts are requested in batches.
+
+    Unknown contacts are logged without dropping the others of their batch.
+    """
+    caplog.set_level(logging.DEBUG, logger="tap-emarsys")
+    contact_ids = [str(contact_id) for contact_id in range(1, 26)] + ["9001", "9002"]
+    batches = []
+    contact_getdata = FakeEmarsysAPI.contact_getdata
+
+    def record_batch(api, payload, **kwargs):
+        batches.append(payload["keyValues"])
+        return contact_getdata(api, payload, **kwargs)
+
+    monkeypatch.setattr(FakeEmarsysAPI, "contact_getdata", record_batch)
+    monkeypatch.setattr(
+        ContactIdsStream,
+        "_list_contacts",
+        lambda self, context, offset: iter(
+            [{"id": contact_id} for contact_id in contact_ids]
+        ),
+    )
+    with FakeEmarsysAPI(contacts=30, fields=2) as api:
+        monkeypatch.setattr(EmarsysStream, "url_base", api.url_base)
+        tap = TapEmarsys(
+            config={"username": "user", "secret": "secret", "contact_batch_size": 10},
+            parse_env_config=False,
+        )
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            tap.streams["contact_ids"].sync()
+
+    # The last, partial, batch is sent once the listing ends
+    assert [len(batch) for batch in batches] == [10, 10, 7]
+    assert [str(contact_id) for batch in batches for contact_id in batch] == contact_ids
+    records = [
+        message["record"]
+        for message in map(json.loads, output.getvalue().splitlines())
+        if message["type"] == "RECORD" and message["stream"] == "contact_fields"
+    ]
+    assert sorted({record["contact_id"] for record in records}) == list(range(1, 26))
+    assert len(records) == 25 * 2
+    assert "Contact 9001 not returned: 2008 No contact found" in caplog.text
+    assert "Contact 9002 not returned: 2008 No contact found" in caplog.text
+    assert "2 contact(s) could not be retrieved from /contact/getdata" in caplog.text